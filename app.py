@@ -1,6 +1,8 @@
 from flask import redirect, url_for, session, g
 from database import UserModel
 from app_init import *
+from core.session_store import SessionEvicted
+from global_variable import local_session
 
 
 @app.route('/')
@@ -17,6 +19,14 @@ def before_request():
         g.user = username
 
 
+@app.errorhandler(SessionEvicted)
+def session_evicted(error):
+    # 会话数据已因空闲超时或内存限制被清理，重新登录后从空状态开始
+    local_session.add_user(error.user)
+    session.pop("user", None)
+    return redirect(url_for("user.login"))
+
+
 if __name__ == '__main__':
     print("🚀 启动Flask应用...")
     print(f"📡 监听端口: 5001")
@@ -8,6 +8,8 @@ SQLALCHEMY = "SQLALCHEMY"
 FLASK = "FLASK"
 APP = "APP"
 PARAMS = "DEFAULT_PARAMS"
+TRAINING = "TRAINING"
+SESSION = "SESSION"
 PATHS = "PATHS"
 
 
@@ -124,6 +126,27 @@ class ConfigApp(object):
     def min_range_size(self):
         return int(self.get(APP, "MIN_RANGE_SIZE"))
 
+    def max_concurrent_jobs(self):
+        return int(self.get(TRAINING, "MAX_CONCURRENT_JOBS"))
+
+    def job_cpu_threads(self):
+        return int(self.get(TRAINING, "JOB_CPU_THREADS"))
+
+    def job_memory_limit_mb(self):
+        return int(self.get(TRAINING, "JOB_MEMORY_LIMIT_MB"))
+
+    def session_max_users(self):
+        return int(self.get(SESSION, "MAX_USERS"))
+
+    def session_ttl_minutes(self):
+        return int(self.get(SESSION, "TTL_MINUTES"))
+
+    def session_memory_limit_mb(self):
+        return int(self.get(SESSION, "MEMORY_LIMIT_MB"))
+
+    def session_spill_threshold_mb(self):
+        return int(self.get(SESSION, "SPILL_THRESHOLD_MB"))
+
     def num_epochs(self):
         return int(self.get(PARAMS, "num_epochs"))
 
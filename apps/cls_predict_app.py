@@ -8,6 +8,7 @@ import pathlib
 import collections
 import torchinfo
 import torchvision
+from model_cache import load_torch_model
 
 
 def get_streamlit_params():
@@ -76,7 +77,7 @@ def predict_pytorch(params, predict_button):
     # ------------------------
     # TODO 区分tensorflow和PyTorch
     # TODO 加入username变量
-    checkpoint = torch.load(f"./user_data/test/models/{model}.pth")
+    checkpoint = load_torch_model(f"./user_data/test/models/{model}.pth", device)
     # print(type(checkpoint), isinstance(checkpoint, torch.nn.Module))
 
     if isinstance(checkpoint, torch.nn.Module):
@@ -21,6 +21,7 @@ import sys
 sys.path.append("utils")
 from dataset_split import DatasetSplit
 from train_util import Trainer
+from data.image_stats import DATASET_MEAN_STD, folder_mean_std
 
 
 def get_streamlit_params():
@@ -63,6 +64,12 @@ def get_streamlit_params():
         img_resize = int(st.sidebar.number_input(label="Image Resize", min_value=0, max_value=256, step=1, value=224))
         params["img_resize"] = img_resize
 
+        # Choose the normalization
+        normalization = st.sidebar.selectbox(label="Normalization", options=["model", DATASET_MEAN_STD],
+                                             help="model: mean/std the model was pretrained with, "
+                                                  "dataset_mean_std: per channel mean/std of the dataset")
+        params["normalization"] = normalization
+
         # Choose the learning rate
         learning_rate = st.sidebar.slider(label="Learning Rate (x1e-4)", min_value=0.0, max_value=100.0, value=1., step=1.0)
         params["lr"] = learning_rate * 1e-4
@@ -123,6 +130,14 @@ def train_pytorch(params, train_button, stop_button):
     from timm.data import resolve_data_config
     from timm.data.transforms_factory import create_transform
     config = resolve_data_config({}, model=model)
+    if params["normalization"] == DATASET_MEAN_STD:
+        # computed once per dataset and kept in its manifest, ToTensor scales to [0, 1]
+        try:
+            mean, std = folder_mean_std(f"./user_data/{user_name}/datasets/image/{dataset}/train_origin")
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+        config["mean"], config["std"] = tuple(mean / 255), tuple(std / 255)
     transform = create_transform(**config)
 
     # ------------------------
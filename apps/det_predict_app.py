@@ -18,6 +18,7 @@ from mmdet.registry import VISUALIZERS
 import sys
 sys.path.append("utils")
 from detection.visual import DetLocalVisualizerRT
+from model_cache import MODEL_CACHE_ENTRIES
 
 
 def get_streamlit_params():
@@ -57,13 +58,8 @@ def get_streamlit_params():
     return params
 
 
-def get_model(params):
-    model = params["model"]
-
-    device = params["device"]
-
-    config_file = f'./utils/detection/{model}.py'
-    checkpoint_file = f'./user_data/test/det_models/{model}.pth'
+@st.cache_resource(max_entries=MODEL_CACHE_ENTRIES)
+def _cached_detector(config_file, checkpoint_file, device, mtimes):
     cfg = Config.fromfile(config_file)
     cfg.visualizer.type="DetLocalVisualizerRT"
     register_all_modules()
@@ -72,6 +68,18 @@ def get_model(params):
     return detector
 
 
+def load_detector(model, device):
+    config_file = f'./utils/detection/{model}.py'
+    checkpoint_file = f'./user_data/test/det_models/{model}.pth'
+    # 修改时间是缓存键的一部分，覆盖配置或权重文件后会重新加载
+    mtimes = (os.path.getmtime(config_file), os.path.getmtime(checkpoint_file))
+    return _cached_detector(config_file, checkpoint_file, device, mtimes)
+
+
+def get_model(params):
+    return load_detector(params["model"], params["device"])
+
+
 def predict_pytorch(params, detector, predict_button):
     # ------------------------
     # Title
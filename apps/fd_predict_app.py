@@ -12,6 +12,7 @@ import torch.nn as nn
 from torchvision import transforms as TR
 import segmentation_models_pytorch as smp
 import albumentations as albu
+from model_cache import load_torch_model
 
 import glob
 import os
@@ -93,7 +94,7 @@ def get_model(params):
     model = params["model"]
     device = params["device"]
     model_path = f"./user_data/test/fd_models/{model}.pth"
-    fd_model = torch.load(model_path).to(device)
+    fd_model = load_torch_model(model_path, device)
     return fd_model
 
 
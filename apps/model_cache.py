@@ -0,0 +1,18 @@
+import os
+
+import streamlit as st
+import torch
+
+# 所有页面共用一个进程，模型缓存也在页面和会话之间共享
+MODEL_CACHE_ENTRIES = 4
+
+
+@st.cache_resource(max_entries=MODEL_CACHE_ENTRIES)
+def _cached_torch_model(path, device, mtime):
+    return torch.load(path, map_location=torch.device(device))
+
+
+def load_torch_model(path, device):
+    """torch.load 的缓存版本，同一模型文件和设备只加载一次；
+    文件的修改时间也是缓存键的一部分，覆盖同名模型后会重新加载"""
+    return _cached_torch_model(path, device, os.path.getmtime(path))
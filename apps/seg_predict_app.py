@@ -12,6 +12,7 @@ import torch.nn as nn
 from torchvision import transforms as TR
 import segmentation_models_pytorch as smp
 import albumentations as albu
+from model_cache import load_torch_model
 
 
 def get_streamlit_params():
@@ -68,7 +69,7 @@ def get_model(params):
     model = params["model"]
     device = params["device"]
     model_path = f"./user_data/test/seg_models/{model}.pth"
-    segmentor = torch.load(model_path).to(device)
+    segmentor = load_torch_model(model_path, device)
     return segmentor
 
 
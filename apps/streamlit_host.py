@@ -0,0 +1,48 @@
+"""
+所有 Streamlit 页面的统一入口
+页面通过 ?page=<name> 选择，在同一个进程中运行，共用已导入的
+torch/mmdet/timm、模型缓存和 GPU
+"""
+import os
+import runpy
+import sys
+
+import streamlit as st
+
+APPS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 页面会导入项目中的 data 等包
+ROOT_DIR = os.path.dirname(APPS_DIR)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+PAGES = {
+    "upload_image": ("上传图像数据集", "upload_image_app.py"),
+    # 缺陷分类
+    "cls_train": ("缺陷分类训练", "cls_train_app.py"),
+    "cls_predict": ("缺陷分类预测", "cls_predict_app.py"),
+    # 缺陷分割
+    "seg_predict": ("缺陷分割预测", "seg_predict_app.py"),
+    # 缺陷检测
+    "det_predict": ("缺陷检测预测", "det_predict_app.py"),
+    # 故障诊断
+    "fd_predict": ("故障诊断预测", "fd_predict_app.py"),
+    "fd_preprocessing": ("故障诊断预处理", "fd_preprocessing_app.py"),
+    "fd_train": ("故障诊断训练", "fd_train_app.py"),
+    # 图像采集
+    "image_capture": ("图像采集", "image_capture_app.py"),
+}
+
+
+def main():
+    page = st.experimental_get_query_params().get("page", [None])[0]
+    if page not in PAGES:
+        st.title("Apps")
+        for name, (title, _) in PAGES.items():
+            st.markdown(f"- [{title}](?page={name})")
+        return
+    # 与 streamlit run 单个脚本时一样，每次重新运行都执行整个页面脚本
+    runpy.run_path(os.path.join(APPS_DIR, PAGES[page][1]), run_name="__main__")
+
+
+main()
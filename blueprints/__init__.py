@@ -1,13 +1,27 @@
-from .user import bp as user_bp
-from .dashboard import bp as dashboard_bp
-from .datasets import bp as datasets_bp
-from .models import bp as models_bp  
-from .train import bp as train_bp
-from .predict import bp as predict_bp
-from .test import bp as test_bp
-from .deployment import bp as deployment_bp
-from .models_storage import bp as models_storage_bp
-from .application import bp as application_bp
-from .data_preprocessing import bp as data_preprocessing_bp
-from .image_capture import bp as image_capture_bp
-from .search import bp as search_bp  
\ No newline at end of file
+import importlib
+
+# blueprint name -> module, modules are imported when the blueprint is
+# first requested so that the app factory can time each of them
+BLUEPRINT_MODULES = {
+    "user_bp": "user",
+    "dashboard_bp": "dashboard",
+    "datasets_bp": "datasets",
+    "models_bp": "models",
+    "train_bp": "train",
+    "predict_bp": "predict",
+    "test_bp": "test",
+    "deployment_bp": "deployment",
+    "models_storage_bp": "models_storage",
+    "application_bp": "application",
+    "data_preprocessing_bp": "data_preprocessing",
+    "image_capture_bp": "image_capture",
+    "search_bp": "search",
+}
+
+__all__ = list(BLUEPRINT_MODULES)
+
+
+def __getattr__(name):
+    if name in BLUEPRINT_MODULES:
+        return importlib.import_module(f".{BLUEPRINT_MODULES[name]}", __name__).bp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,106 +1,139 @@
-import json
+import hashlib
+import time
 
 from flask import (Blueprint,
                    render_template,
                    request, redirect,
                    url_for,
                    jsonify,
-                   session)
+                   session,
+                   make_response)
 from decorators import login_required
+from utils.i18n import catalog, DEFAULT_LANGUAGE
 
 bp = Blueprint(name="dashboard", import_name=__name__, url_prefix="/dashboard")
 
+# 模板随部署更新，ETag 中带上进程启动时间
+_STARTED = str(time.time())
+
+
+def _language():
+    lang = request.args.get("lang")
+    if lang in catalog.languages():
+        session["lang"] = lang
+    return session.get("lang", DEFAULT_LANGUAGE)
+
+
+def _render_dashboard(template):
+    """渲染页面框架，文本来自内存缓存，内容未变时返回 304"""
+    lang = _language()
+    etag = hashlib.sha1(
+        f"{template}|{lang}|{catalog.version()}|{_STARTED}".encode()
+    ).hexdigest()
+    if request.method == "GET" and etag in request.if_none_match:
+        response = make_response("", 304)
+    else:
+        # 模板中的变量名沿用 zh，内容为当前语言的文本
+        response = make_response(
+            render_template(template, zh=catalog.section("Dashboard", lang))
+        )
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
+
 
 @bp.route("/", methods=["GET", "POST"])
 @login_required
 def dashboard():
     # TODO 加入用户信息
     # username = session["user"]
-    with open("language/text-zh.json", "r", encoding="utf-8") as f:
-        zh_json = json.load(f)
-    return render_template(
-        "dashboard.html",
-        zh=zh_json["Dashboard"]
-    )
+    return _render_dashboard("dashboard.html")
 
 @bp.route("/application", methods=["GET", "POST"])
 @login_required
 def dashboard_application():
     # TODO 加入用户信息
     # username = session["user"]
-    with open("language/text-zh.json", "r", encoding="utf-8") as f:
-        zh_json = json.load(f)
-    return render_template(
-        "application.html",
-        zh=zh_json["Dashboard"]
-    )
+    return _render_dashboard("application.html")
 
 @bp.route("/cls", methods=["GET", "POST"])
 @login_required
 def dashboard_cls():
     # username = session["user"]
-    with open("language/text-zh.json", "r", encoding="utf-8") as f:
-        zh_json = json.load(f)
-    return render_template(
-        "templates_cls/dashboard.html",
-        zh=zh_json["Dashboard"]
-    )
+    return _render_dashboard("templates_cls/dashboard.html")
 
 
 @bp.route("/seg", methods=["GET", "POST"])
 @login_required
 def dashboard_seg():
     # username = session["user"]
-    with open("language/text-zh.json", "r", encoding="utf-8") as f:
-        zh_json = json.load(f)
-    return render_template(
-        "templates_seg/dashboard.html",
-        zh=zh_json["Dashboard"]
-    )
+    return _render_dashboard("templates_seg/dashboard.html")
 
 @bp.route("/det", methods=["GET", "POST"])
 @login_required
 def dashboard_det():
     # username = session["user"]
-    with open("language/text-zh.json", "r", encoding="utf-8") as f:
-        zh_json = json.load(f)
-    return render_template(
-        "templates_det/dashboard.html",
-        zh=zh_json["Dashboard"]
-    )
+    return _render_dashboard("templates_det/dashboard.html")
 
 @bp.route("/fd", methods=["GET", "POST"])
 @login_required
 def dashboard_fd():
     # username = session["user"]
-    with open("language/text-zh.json", "r", encoding="utf-8") as f:
-        zh_json = json.load(f)
-    return render_template(
-        "templates_fd/dashboard.html",
-        zh=zh_json["Dashboard"]
-    )
+    return _render_dashboard("templates_fd/dashboard.html")
 
 @bp.route("/ic", methods=["GET", "POST"])
 @login_required
 def dashboard_ic():
     # username = session["user"]
-    with open("language/text-zh.json", "r", encoding="utf-8") as f:
-        zh_json = json.load(f)
-    return render_template(
-        "templates_ic/dashboard.html",
-        zh=zh_json["Dashboard"]
-    )
+    return _render_dashboard("templates_ic/dashboard.html")
+
+@bp.route("/jobs", methods=["GET"])
+@login_required
+def dashboard_jobs():
+    from core.scheduler import get_scheduler
+
+    return jsonify(get_scheduler().status(session["user"]))
+
+
+@bp.route("/jobs/<int:job_id>/<action>", methods=["POST"])
+@login_required
+def dashboard_job_action(job_id, action):
+    from core.scheduler import get_scheduler
+
+    scheduler = get_scheduler()
+    job = scheduler.get_job(job_id)
+    if job is None or job["username"] != session["user"]:
+        return jsonify({"error": "job not found"}), 404
+    if action not in ("pause", "resume", "cancel"):
+        return jsonify({"error": "invalid action"}), 400
+    ok = getattr(scheduler, action)(job_id)
+    job = scheduler.get_job(job_id)
+    job["options"] = None
+    return jsonify({"success": ok, "job": job})
+
+
+@bp.route("/jobs/<int:job_id>/metrics", methods=["GET"])
+@login_required
+def dashboard_job_metrics(job_id):
+    from config import config_reader
+    from core.metrics_store import read_metrics
+    from core.scheduler import get_scheduler
+
+    job = get_scheduler().get_job(job_id)
+    if job is None or job["username"] != session["user"]:
+        return jsonify({"error": "job not found"}), 404
+    checkpoint_dir = config_reader.read_config(job["config_file"]).checkpoint_dir()
+    cursor = request.args.get("cursor", 0, type=int)
+    return jsonify(read_metrics(checkpoint_dir, cursor))
+
 
 @bp.route("/kg", methods=["GET", "POST"])
 @login_required
 def dashboard_kg():
     # username = session["user"]
-    with open("language/text-zh.json", "r", encoding="utf-8") as f:
-        zh_json = json.load(f)
-    return render_template(
-        "templates_lk/dashboard.html",
-        zh=zh_json["Dashboard"]
-    )
+    return _render_dashboard("templates_lk/dashboard.html")
 # test 
 # @bp.route("/test", methods=["GET", "POST"])
 # @login_required
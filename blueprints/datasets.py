@@ -11,8 +11,11 @@ from database import TabularModel, UserModel, ImageModel
 from extensions import db
 from global_variable import USER_ROOT
 from decorators import login_required
-from oldutils import config_ops, upload_util
 from utils import user_data_ops
+from utils.lazy_import import lazy_import
+
+# upload_util imports the TensorFlow dataset classes
+upload_util = lazy_import("oldutils.upload_util")
 
 bp = Blueprint(name="datasets", import_name=__name__, url_prefix="/datasets")
 
@@ -8,7 +8,6 @@ from flask import (Blueprint,
                    request,
                    jsonify)
 from decorators import login_required
-from utils import create_pytorch_model
 
 bp = Blueprint(name="models", import_name=__name__, url_prefix="/models")
 
@@ -9,7 +9,6 @@ from flask import (Blueprint,
                    jsonify,
                    g)
 from decorators import login_required
-from utils import create_pytorch_model
 from database import ModelsStorage
 import pathlib
 import shutil
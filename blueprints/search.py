@@ -1,10 +1,7 @@
-from py2neo import Graph, NodeMatcher
 from flask import Blueprint, render_template, request, jsonify, session, Response
-from apps.neo4j_helper import start_neo4j, perform_query
-from utils.kg.nlp_utils import process_question_for_both
-from utils.llm.llm_client import llm_client
-from utils.kg.graph_builder import build_knowledge_graph_from_document
-from py2neo import Graph
+from utils.kg.query_guard import run_guarded_query, get_query_metrics, CypherGuardError
+from utils.lazy_import import lazy_import
+import threading
 import uuid
 import sqlite3
 import json
@@ -12,9 +9,15 @@ import os
 from datetime import datetime
 import time
 from werkzeug.utils import secure_filename
-import docx
 import re
 
+# neo4j, OpenAI and the graph builder are only imported on first use
+py2neo = lazy_import("py2neo")
+neo4j_helper = lazy_import("apps.neo4j_helper")
+nlp_utils = lazy_import("utils.kg.nlp_utils")
+graph_builder = lazy_import("utils.kg.graph_builder")
+schema_cache = lazy_import("utils.kg.schema_cache")
+
 # 创建蓝图
 bp = Blueprint('search', __name__)
 
@@ -66,8 +69,6 @@ def init_db():
     conn.close()
     print("✅ 数据库初始化完成")
 
-# 初始化数据库
-init_db()
 
 def init_kg_db():
     """初始化知识图谱数据库"""
@@ -106,8 +107,23 @@ def init_kg_db():
     conn.close()
     print("✅ 知识图谱数据库初始化完成")
 
-# 确保应用启动时初始化数据库
-init_kg_db()
+# 确保处理请求前数据库已初始化
+
+_db_lock = threading.Lock()
+_db_initialized = False
+
+
+@bp.before_request
+def ensure_databases():
+    """数据库在第一次请求时初始化，而不是在导入时"""
+    global _db_initialized
+    if _db_initialized:
+        return
+    with _db_lock:
+        if not _db_initialized:
+            init_db()
+            init_kg_db()
+            _db_initialized = True
 
 def get_user_id():
     """获取或创建用户ID"""
@@ -293,7 +309,7 @@ def clean_content_for_json(content):
 # KG 相关路由
 @bp.route('/kg/query_page')
 def kg_query_page():
-    start_neo4j()
+    neo4j_helper.start_neo4j()
     return render_template('templates_lk/kg.html')
 
 # 原始的知识图谱查询路由
@@ -304,20 +320,24 @@ def kg_search_original():
         if not query_text:
             return jsonify({'message': '请输入查询内容'}), 400
 
-        cypher_query, cypher_query_vs = process_question_for_both(query_text)
+        cypher_query, cypher_query_vs = nlp_utils.process_question_for_both(query_text)
         
         if not cypher_query:
             return jsonify({'message': '未能生成有效的Cypher语句'}), 500
 
-        graph = Graph("bolt://localhost:7687", auth=("neo4j", "3080neo4j"), secure=False)
-        
-        results = graph.run(cypher_query)
-        text_results = []
+        graph = py2neo.Graph("bolt://localhost:7687", auth=("neo4j", "3080neo4j"), secure=False)
         
-        for record in results:
-            text_results.append(dict(record))
+        try:
+            text_results, cypher_query = run_guarded_query(graph, cypher_query)
+        except CypherGuardError as guard_error:
+            return jsonify({'message': f'查询被拒绝: {str(guard_error)}', 'reason': guard_error.reason}), 400
 
-        viz_results = graph.run(cypher_query_vs)
+        # 可视化查询失败不影响文本结果，与 kg_search 一致返回空的节点和关系
+        try:
+            viz_results, cypher_query_vs = run_guarded_query(graph, cypher_query_vs)
+        except Exception as viz_error:
+            print(f"❌ 可视化查询执行失败: {viz_error}")
+            viz_results = []
         nodes = []
         relationships = []
         
@@ -371,57 +391,69 @@ def kg_search():
             return jsonify({'success': False, 'message': '问题不能为空'}), 400
             
         # 连接到Neo4j
-        graph = Graph("bolt://localhost:7687", auth=("neo4j", "3080neo4j"), secure=False)
+        graph = py2neo.Graph("bolt://localhost:7687", auth=("neo4j", "3080neo4j"), secure=False)
         
-        # 如果是默认图谱，使用LLM生成查询
         if kg_id == 'default':
             # 确保Neo4j服务已启动
-            start_neo4j()
-            
-            # 调用NLP处理函数生成两个查询
-            answer_cypher, visualization_cypher = process_question_for_both(question)
-            
-            # 执行答案查询
-            answer_result = None
-            if answer_cypher:
-                try:
-                    print(f"🔍 执行答案查询: {answer_cypher}")
-                    answer_result = graph.run(answer_cypher).data()
-                    print(f"✅ 答案查询成功，返回 {len(answer_result)} 条结果")
-                except Exception as query_error:
-                    print(f"❌ 答案查询执行失败: {query_error}")
-                    answer_result = []
-            
-            # 执行可视化查询
-            viz_result = None
-            if visualization_cypher:
-                try:
-                    print(f"🎨 执行可视化查询: {visualization_cypher}")
-                    viz_result = graph.run(visualization_cypher).data()
-                    print(f"✅ 可视化查询成功，返回 {len(viz_result)} 条结果")
-                    
-                    # 格式化可视化数据
-                    viz_data = format_visualization_data(viz_result)
-                    
-                except Exception as viz_error:
-                    print(f"❌ 可视化查询执行失败: {viz_error}")
-                    viz_data = None
-            else:
+            neo4j_helper.start_neo4j()
+            graph_type = '系统默认图谱'
+        else:
+            # 验证用户权限
+            user_id = session.get('user_id', 'anonymous')
+            conn = sqlite3.connect(KG_DB_PATH)
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT name FROM user_kgs WHERE kg_id = ? AND user_id = ?', 
+                (kg_id, user_id)
+            )
+            result = cursor.fetchone()
+            conn.close()
+            if not result:
+                return jsonify({'success': False, 'message': '知识图谱不存在或无权访问'}), 404
+            graph_type = f'用户子图: {result[0]}'
+        
+        # 调用NLP处理函数生成两个查询（基于所选图谱的schema）
+        answer_cypher, visualization_cypher = nlp_utils.process_question_for_both(question, kg_id)
+        # 用户子图的查询在执行前检查节点标签，不能只依赖提示词约束
+        scope_label = schema_cache.get_subgraph_label(kg_id)
+        
+        # 执行答案查询
+        answer_result = None
+        if answer_cypher:
+            try:
+                print(f"🔍 执行答案查询: {answer_cypher}")
+                answer_result, answer_cypher = run_guarded_query(graph, answer_cypher, scope_label=scope_label)
+                print(f"✅ 答案查询成功，返回 {len(answer_result)} 条结果")
+            except Exception as query_error:
+                print(f"❌ 答案查询执行失败: {query_error}")
+                answer_result = []
+        
+        # 执行可视化查询
+        viz_result = None
+        if visualization_cypher:
+            try:
+                print(f"🎨 执行可视化查询: {visualization_cypher}")
+                viz_result, visualization_cypher = run_guarded_query(graph, visualization_cypher, scope_label=scope_label)
+                print(f"✅ 可视化查询成功，返回 {len(viz_result)} 条结果")
+                
+                # 格式化可视化数据
+                viz_data = format_visualization_data(viz_result)
+                
+            except Exception as viz_error:
+                print(f"❌ 可视化查询执行失败: {viz_error}")
                 viz_data = None
-            
-            return jsonify({
-                'success': True,
-                'query': answer_cypher,
-                'visualization_query': visualization_cypher,
-                'result': answer_result or [],
-                'visualization_data': viz_data,
-                'message': '查询成功',
-                'graph_type': '系统默认图谱'
-            })
         else:
-            # 用户图谱的处理逻辑保持不变...
-            # ... (现有的用户图谱代码)
-            pass
+            viz_data = None
+        
+        return jsonify({
+            'success': True,
+            'query': answer_cypher,
+            'visualization_query': visualization_cypher,
+            'result': answer_result or [],
+            'visualization_data': viz_data,
+            'message': '查询成功',
+            'graph_type': graph_type
+        })
             
     except Exception as e:
         import traceback
@@ -571,7 +603,7 @@ def get_kg_visualization(kg_id):
         
         if kg_id == 'default':
             # 返回默认图谱的可视化数据
-            graph = Graph("bolt://localhost:7687", auth=("neo4j", "3080neo4j"), secure=False)
+            graph = py2neo.Graph("bolt://localhost:7687", auth=("neo4j", "3080neo4j"), secure=False)
             
             # ✅ 修复：简化查询语句，避免语法错误
             nodes_query = """
@@ -760,7 +792,7 @@ def get_subgraph_info_api(kg_id):
     try:
         if kg_id == 'default':
             # ✅ 处理默认图谱的统计
-            graph = Graph("bolt://localhost:7687", auth=("neo4j", "3080neo4j"), secure=False)
+            graph = py2neo.Graph("bolt://localhost:7687", auth=("neo4j", "3080neo4j"), secure=False)
             
             try:
                 # ✅ 修复：简化查询语句
@@ -997,7 +1029,7 @@ def create_temp_kg():
         
         # 使用新的知识图谱构建模块
         try:
-            build_result = build_knowledge_graph_from_document(file_path, kg_id, kg_name)
+            build_result = graph_builder.build_knowledge_graph_from_document(file_path, kg_id, kg_name)
             
             if build_result['success']:
                 # 更新知识图谱状态和元数据
@@ -1124,7 +1156,7 @@ def get_kg_list():
 def check_neo4j_connection():
     """检查Neo4j连接状态"""
     try:
-        graph = Graph("bolt://localhost:7687", auth=("neo4j", "3080neo4j"), secure=False)
+        graph = py2neo.Graph("bolt://localhost:7687", auth=("neo4j", "3080neo4j"), secure=False)
         
         # 执行简单查询测试连接
         result = graph.run("RETURN 1 as test").data()
@@ -1149,6 +1181,14 @@ def check_neo4j_connection():
             'status': 'connection_failed'
         }), 500
 
+@bp.route('/kg/query_metrics', methods=['GET'])
+def kg_query_metrics():
+    """获取生成查询的防护统计（拒绝次数、执行耗时）"""
+    return jsonify({
+        'success': True,
+        'metrics': get_query_metrics()
+    })
+
 # LLM 相关路由
 @bp.route('/llm/query_page')
 def llm_query_page():
@@ -1,40 +1,68 @@
+import os
+import threading
+
 import numpy as np
 import tensorflow as tf
 from lime import lime_tabular, lime_image
 from scipy.misc import imresize
 
+IMAGE_BATCH_SIZE = 1000
+
+_lime_cache = {}
+_lime_cache_lock = threading.Lock()
+
+
+def _get_lime_tabular_explainer(dataset, verbose):
+    """LimeTabularExplainer built from the training split, cached per dataset.
+
+    Building it reads the whole training csv and computes the discretizer
+    statistics, so it is only redone when the training file or the selected
+    features change.
+    """
+    train_file = dataset.get_train_file()
+    key = (
+        train_file,
+        os.path.getmtime(train_file),
+        tuple(dataset.get_feature_names()),
+        tuple(dataset.get_targets()),
+        verbose,
+    )
+    with _lime_cache_lock:
+        if key in _lime_cache:
+            return _lime_cache[key]
+
+    train_dataset, training_labels = dataset.make_numpy_array(train_file)
+    (
+        categorical_features,
+        categorical_index,
+        categorical_names,
+    ) = dataset.get_categorical_features()
+
+    explainer = lime_tabular.LimeTabularExplainer(
+        train_dataset,
+        feature_names=dataset.get_feature_names(),
+        class_names=dataset.get_target_labels(),
+        categorical_features=categorical_index,
+        categorical_names=categorical_names,
+        training_labels=training_labels,
+        verbose=verbose,
+        mode=dataset.get_mode(),
+    )
+    with _lime_cache_lock:
+        for k in [k for k in _lime_cache if k[0] == train_file]:
+            del _lime_cache[k]
+        _lime_cache[key] = explainer
+    return explainer
+
 
 class TabularExplainer:
     def __init__(self, dataset, verbose=True):
-
-        train_dataset, training_labels = dataset.make_numpy_array(
-            dataset.get_train_file()
-        )
-
-        mode = dataset.get_mode()
-        (
-            categorical_features,
-            categorical_index,
-            categorical_names,
-        ) = dataset.get_categorical_features()
-        unique = dataset.get_target_labels()
-
-        self._mode = mode
+        self._mode = dataset.get_mode()
         self.dataset = dataset
-
-        self._explainer = lime_tabular.LimeTabularExplainer(
-            train_dataset,
-            feature_names=dataset.get_feature_names(),
-            class_names=unique,
-            categorical_features=categorical_index,
-            categorical_names=categorical_names,
-            training_labels=training_labels,
-            verbose=verbose,
-            mode=self._mode,
-        )
+        self._explainer = _get_lime_tabular_explainer(dataset, verbose)
 
     def explain_instance(
-        self, model, features, num_features=5, top_labels=3, sel_target=None
+        self, predict_batch, features, num_features=5, top_labels=3, sel_target=None
     ):
 
         sample = self.dataset.create_feat_array(features)
@@ -46,11 +74,8 @@ class TabularExplainer:
             local_features = {k: x[:, i] for i, k in enumerate(features.keys())}
             local_features = self.dataset.from_array(local_features)
 
-            predict_input_fn = tf.estimator.inputs.numpy_input_fn(
-                x=local_features, y=None, num_epochs=1, shuffle=False
-            )
             with tf.device("/cpu:0"):  # TODO maybe check if gpu is free
-                predictions = list(model.predict(input_fn=predict_input_fn))
+                predictions = predict_batch(local_features)
 
             if self._mode == "classification":
                 return np.array([x["probabilities"] for x in predictions])
@@ -78,15 +103,12 @@ class ImageExplainer:
         self._dataset = dataset
         self._explainer = lime_image.LimeImageExplainer(verbose=verbose)
 
-    def explain_instance(self, model, features, num_features=5):
+    def explain_instance(self, predict_batch, features, num_features=5):
         def predict_fn(x):
             x = x.astype(np.float32)
             x = np.apply_along_axis(self._dataset.normalize, 0, x)
-            predict_input_fn = tf.estimator.inputs.numpy_input_fn(
-                x=x, y=None, num_epochs=1, shuffle=False
-            )
             with tf.device("/cpu:0"):  # TODO maybe check if gpu is free
-                probabilities = list(model.predict(input_fn=predict_input_fn))
+                probabilities = predict_batch(x)
             return np.array([x["probabilities"] for x in probabilities])
 
         features = imresize(features, self._dataset.get_image_size(), interp="bilinear")
@@ -94,7 +116,7 @@ class ImageExplainer:
         explain_result = self._explainer.explain_instance(
             features,
             predict_fn,
-            batch_size=100,
+            batch_size=IMAGE_BATCH_SIZE,
             num_features=num_features,
             labels=self._dataset.get_class_names(),
             top_labels=len(self._dataset.get_class_names()),
@@ -104,10 +126,7 @@ class ImageExplainer:
 
         features = self._dataset.normalize(features)
 
-        predict_input_fn = tf.estimator.inputs.numpy_input_fn(
-            x=features[np.newaxis, ...], y=None, num_epochs=1, shuffle=False
-        )
         with tf.device("/cpu:0"):  # TODO maybe check if gpu is free
-            predictions = list(model.predict(input_fn=predict_input_fn))
+            predictions = predict_batch(features[np.newaxis, ...])
 
         return explain_result, predictions[0]["probabilities"]
@@ -14,6 +14,10 @@ from tensorflow.python.platform import gfile
 from tensorflow.python.platform import tf_logging
 from tensorflow.python.summary import summary_iterator
 
+from ..metrics_store import EVAL, write_metrics
+
+BEST_EVAL_RESULT_FILE = "best_eval_result.json"
+
 
 def _verify_compare_fn_args(compare_fn):
     """Verifies compare_fn arguments."""
@@ -165,16 +169,13 @@ class BestExporter(Exporter):
         self, estimator, export_path, checkpoint_path, eval_result, is_the_final_export
     ):
         export_result = None
+        write_metrics(
+            estimator.model_dir, EVAL, eval_result["global_step"], eval_result
+        )
 
-        if self._model_dir != estimator.model_dir and self._event_file_pattern:
-            # Loads best metric from event files.
-            tf_logging.info("Loading best metric from event files.")
-
+        if self._model_dir != estimator.model_dir:
             self._model_dir = estimator.model_dir
-            full_event_file_pattern = os.path.join(
-                self._model_dir, self._event_file_pattern
-            )
-            self._best_eval_result = self._get_best_eval_result(full_event_file_pattern)
+            self._best_eval_result = self._load_best_eval_result()
         if os.path.isfile(os.path.join(export_path, "export.log")):
             self._log = {}
             try:
@@ -191,6 +192,7 @@ class BestExporter(Exporter):
         ):
             tf_logging.info("Performing best model export.")
             self._best_eval_result = eval_result
+            self._save_best_eval_result()
 
             export_result = self._saved_model_exporter.export(
                 estimator,
@@ -213,9 +215,43 @@ class BestExporter(Exporter):
 
         return export_result
 
+    def _load_best_eval_result(self):
+        """Best eval result so far, from the persisted record if there is one.
+
+        Models trained before the record existed are scanned once from their
+        event files; the result is then kept in memory and on disk.
+        """
+        record = os.path.join(self._model_dir, BEST_EVAL_RESULT_FILE)
+        if os.path.isfile(record):
+            try:
+                with open(record, "r") as fp:
+                    return json.load(fp)
+            except (json.JSONDecodeError, OSError):
+                pass
+        if not self._event_file_pattern:
+            return None
+        tf_logging.info("Loading best metric from event files.")
+        return self._get_best_eval_result(
+            os.path.join(self._model_dir, self._event_file_pattern)
+        )
+
+    def _save_best_eval_result(self):
+        record = os.path.join(self._model_dir, BEST_EVAL_RESULT_FILE)
+        with open(record + ".tmp", "w") as fp:
+            json.dump({k: float(v) for k, v in self._best_eval_result.items()}, fp)
+        os.replace(record + ".tmp", record)
+
     def _copy_checkpoint(self, checkpoint_pattern, dest_path, step):
+        # checkpoint shards are never modified in place, so the export can
+        # share them with the training dir instead of copying the bytes
         for file in glob.glob(checkpoint_pattern + "*"):
-            shutil.copy(file, dest_path)
+            dest = os.path.join(dest_path, os.path.basename(file))
+            if os.path.exists(dest):
+                os.remove(dest)
+            try:
+                os.link(file, dest)
+            except OSError:
+                shutil.copy(file, dest)
         with open(os.path.join(dest_path, "checkpoint"), "w") as fp:
             text = 'model_checkpoint_path: "model.ckpt-number"\n'.replace(
                 "number", str(step)
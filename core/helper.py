@@ -7,16 +7,18 @@ from io import BytesIO
 
 import PIL.Image
 import cv2
-import dill as pickle
 import numpy as np
 import pandas as pd
 from skimage.segmentation import mark_boundaries
 
 from data import tabular, image
+from data.image_stats import summarize_image_stats
+from data.store import write_dataset
 from data.utils.image import (
     find_image_files_folder_per_class,
     find_image_files_from_file,
     find_images_test_file,
+    load_npz_arrays,
 )
 from oldutils import (
     feature_util,
@@ -29,6 +31,7 @@ from oldutils import (
 from oldutils.explain_util import get_reg_explain, get_class_explain, clean_predict_table
 from oldutils.request_util import *
 from oldutils.sys_ops import unzip, tree_remove, find_dataset_from_numpy
+from .ice import ice_frame
 
 
 def encode_image(path):
@@ -287,23 +290,29 @@ class Tabular(Helper):
         return example
 
     def create_ice_data(self, request):
-        file_path, unique_val_column = explain_util.generate_ice_df(
-            request,
-            self._dataset.get_df(),
-            self._dataset.get_file(),
-            self._dataset.get_targets(),
-            self._dataset.get_dtypes(),
+        """ICE rows as a DataFrame, to be predicted with ``predict_frame_estimator``."""
+        return ice_frame(
+            self._dataset,
+            [request.get_json()["features_values"]],
+            request.get_json()["explain_feature"],
         )
-        return file_path, unique_val_column
 
-    def process_ice_request(self, request, unique_val_column, pred):
+    def process_ice_request(self, request, grid, pred):
         exp_target = request.get_json()["exp_target"]
         exp_feature = request.get_json()["explain_feature"]
-        lab, probs = explain_util.get_exp_target_prediction(
-            self._dataset.get_targets(), exp_target, pred, self._dataset.get_dtypes()
-        )
+
+        if self.get_mode() == "classification":
+            lab = list(pred["preds"])
+            probs = [[float(score) for score in scores] for scores in pred["scores"]]
+        else:
+            values = np.asarray(pred["preds"], dtype=float)
+            if values.ndim > 1:
+                values = values[:, self._dataset.get_targets().index(exp_target)]
+            lab = values.tolist()
+            probs = None
+
         data = {
-            exp_feature: unique_val_column,
+            exp_feature: grid.tolist(),
             exp_target: lab,
             exp_target + "_prob": probs,
         }
@@ -363,7 +372,7 @@ class Tabular(Helper):
         )
 
     def write_dataset(self, data_path):
-        pickle.dump(self._dataset, open(data_path, "wb"))
+        write_dataset(self._dataset, data_path)
 
     def get_mode(self):
         return self._dataset.get_mode()
@@ -450,6 +459,8 @@ class Image(Helper):
         size = self._dataset.get_image_size()
         unique, counts = np.unique(self._dataset.get_labels(), return_counts=True)
         counts = counts.astype(int).tolist()
+        stats = self._dataset.get_image_stats()
+        stats = summarize_image_stats(stats) if stats is not None else None
         if size is not None:
             return {
                 "height": size[0],
@@ -457,14 +468,17 @@ class Image(Helper):
                 "data": self.get_labels_images(),
                 "n_channels": size[2],
                 "counts": dict(zip(unique, counts)),
+                "stats": stats,
             }
+        height, width, n_channels = self._dataset.get_sample_shape()
         return {
-            "height": self._dataset.get_sample().shape[0],
-            "width": self._dataset.get_sample().shape[1],
+            "height": height,
+            "width": width,
             "data": self.get_labels_images(),
             "num_outputs": self._dataset.get_num_outputs(),
-            "n_channels": self._dataset.get_sample().shape[2],
+            "n_channels": n_channels,
             "counts": dict(zip(unique, counts)),
+            "stats": stats,
         }
 
     def get_targets(self):
@@ -492,12 +506,17 @@ class Image(Helper):
             if isinstance(self._dataset.get_labels(), list)
             else self._dataset.get_labels().tolist()
         )
+        stats = self._dataset.get_image_stats()
         for c in class_names:
             data[str(c)] = {}
-            im_path = self._dataset._images[labels.index(c)]
-            data[str(c)]["img"] = encode_image(im_path)
-            if self._dataset.get_mode() != 3:
-                data[str(c)]["extension"] = im_path.split(".")[-1]
+            index = labels.index(c)
+            if stats is None:
+                data[str(c)]["img"] = encode_image(self._dataset._images[index])
+            else:
+                # pre-resized jpeg thumbnail, the full image is not read
+                thumbnail = stats.at[index, "thumbnail"]
+                data[str(c)]["img"] = base64.b64encode(thumbnail).decode()
+                data[str(c)]["extension"] = "jpg"
         return data
 
     def process_features_request(self, request):
@@ -505,7 +524,7 @@ class Image(Helper):
         features_params = request.get_json()["augmentation_params"]
 
         self._dataset.set_normalization_method(request.get_json()["normalization"])
-        h, w, c = self._dataset.get_sample().shape
+        h, w, c = self._dataset.get_sample_shape()
         self._dataset.set_image_size(
             request.get_json()["height"], request.get_json()["width"], c
         )
@@ -618,7 +637,7 @@ class Image(Helper):
 
                 if option == ".option0":
                     test_path = os.path.join(test_path, get_filename(request) + ".npz")
-                    data = np.load(test_path)
+                    data = load_npz_arrays(test_path)
                     test_filename = data["x"]
 
                     if "y" in data:
@@ -635,17 +654,9 @@ class Image(Helper):
                     return False, test_filename, None, None
 
                 elif option == ".option2":
-                    all_classes = [
-                        c for c in os.listdir(test_path) if not c.startswith(".")
-                    ]
-                    for cl in all_classes:
-                        list_files = [
-                            os.path.join(test_path, cl, f)
-                            for f in os.listdir(os.path.join(test_path, cl))
-                            if not f.startswith(".")
-                        ]
-                        test_filename += list_files
-                        labels += [cl] * len(list_files)
+                    test_filename, labels, _ = find_image_files_folder_per_class(
+                        test_path, require_all=False
+                    )
 
                 elif option == ".option3":
                     labels_file = [
@@ -738,7 +749,7 @@ class Image(Helper):
 
     def write_dataset(self, data_path):
         # self._dataset.head(1000)  # TODO
-        pickle.dump(self._dataset, open(data_path, "wb"))
+        write_dataset(self._dataset, data_path)
 
     def explain_return(self, request, results):
 
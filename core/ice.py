@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from data.utils.tabular import load_column_stats
+
+ICE_GRID_SIZE = 40
+
+
+def ice_grid(dataset, feature, grid_size=ICE_GRID_SIZE):
+    """Values ``feature`` is swept over."""
+    dtypes = dataset.get_dtypes()
+    df = dataset.get_df()
+    if feature in dtypes["numerical"]:
+        stats = load_column_stats(dataset.get_train_file())[feature]
+        return np.linspace(
+            stats["mean"] - 2 * stats["std"],
+            stats["mean"] + 2 * stats["std"],
+            num=grid_size,
+        )
+    if feature in dtypes["hash"]:
+        # too many values to sweep, keep the most frequent ones
+        return np.sort(df[feature].value_counts().index[:grid_size].values)
+    return np.sort(df[feature].dropna().unique())
+
+
+def ice_frame(dataset, instances, feature, grid_size=ICE_GRID_SIZE):
+    """Rows of ``instances`` with ``feature`` swept over its grid.
+
+    ``instances`` is a DataFrame or a list of feature dicts. The rows are
+    built with one repeat of the instances and one tile of the grid, so the
+    curves of every instance are predicted in a single batch. Returns the
+    frame, grid-major within each instance, and the grid.
+    """
+    if not isinstance(instances, pd.DataFrame):
+        instances = pd.DataFrame(list(instances))
+    values = ice_grid(dataset, feature, grid_size)
+    frame = instances.loc[instances.index.repeat(len(values))].reset_index(drop=True)
+    frame[feature] = np.tile(values, len(instances))
+    return frame, values
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import time
+
+import tensorflow as tf
+
+METRICS_DB = "metrics.db"
+
+METRIC_TAGS = ["accuracy", "r_squared", "loss"]
+
+TRAIN = "train_orgin"
+EVAL = "eval"
+
+
+def _metric_name(tag):
+    return tag.split("_1")[0]
+
+
+def _connect(model_dir):
+    conn = sqlite3.connect(os.path.join(model_dir, METRICS_DB), timeout=30)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS points (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            split TEXT NOT NULL,
+            step INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            value REAL NOT NULL,
+            wall_time REAL NOT NULL
+        )
+        """
+    )
+    return conn
+
+
+def has_metrics(model_dir):
+    return os.path.isfile(os.path.join(model_dir, METRICS_DB))
+
+
+def write_metrics(model_dir, split, step, values):
+    """Appends the tracked scalars of ``values`` ({tag: value}) at ``step``."""
+    rows = [
+        (split, int(step), _metric_name(tag), float(value), time.time())
+        for tag, value in values.items()
+        if _metric_name(tag) in METRIC_TAGS
+    ]
+    if not rows:
+        return
+    os.makedirs(model_dir, exist_ok=True)
+    with _connect(model_dir) as conn:
+        conn.executemany(
+            "INSERT INTO points (split, step, tag, value, wall_time) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def read_metrics(model_dir, cursor=0):
+    """Training and evaluation curves recorded after ``cursor``.
+
+    Returns ``{"cursor": c, "train_orgin": {...}, "eval": {...}}`` where each
+    split maps ``steps`` and every tag to aligned lists; pass ``c`` back to
+    only get the points written since.
+    """
+    result = {"cursor": cursor}
+    if not has_metrics(model_dir):
+        return result
+    with _connect(model_dir) as conn:
+        rows = conn.execute(
+            "SELECT id, split, step, tag, value FROM points WHERE id > ? ORDER BY id",
+            (cursor,),
+        ).fetchall()
+
+    for point_id, split, step, tag, value in rows:
+        curves = result.setdefault(split, {"steps": []})
+        if not curves["steps"] or curves["steps"][-1] != step:
+            curves["steps"].append(step)
+        curves.setdefault(tag, []).append(value)
+        result["cursor"] = point_id
+    return result
+
+
+class MetricsStoreHook(tf.estimator.SessionRunHook):
+    """Writes the training scalars to the metrics store every n steps.
+
+    Same summaries as the ``SummarySaverHook`` writes to event files, so the
+    curves can be read without loading TensorBoard event files.
+    """
+
+    def __init__(self, model_dir, every_n_steps):
+        self._model_dir = model_dir
+        self._timer = tf.estimator.SecondOrStepTimer(every_steps=every_n_steps)
+
+    def begin(self):
+        self._summary_op = tf.compat.v1.summary.merge_all()
+        self._global_step = tf.compat.v1.train.get_global_step()
+        self._request_summary = True
+
+    def before_run(self, run_context):
+        fetches = {"global_step": self._global_step}
+        if self._request_summary and self._summary_op is not None:
+            fetches["summary"] = self._summary_op
+        return tf.estimator.SessionRunArgs(fetches)
+
+    def after_run(self, run_context, run_values):
+        step = run_values.results["global_step"]
+        if "summary" in run_values.results:
+            summary = tf.compat.v1.Summary.FromString(run_values.results["summary"])
+            write_metrics(
+                self._model_dir,
+                TRAIN,
+                step,
+                {
+                    v.tag: v.simple_value
+                    for v in summary.value
+                    if v.HasField("simple_value")
+                },
+            )
+            self._timer.update_last_triggered_step(step)
+        self._request_summary = self._timer.should_trigger_for_step(step + 1)
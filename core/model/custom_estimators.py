@@ -12,7 +12,7 @@ from keras.utils.generic_utils import (
     unpack_singleton,
 )
 
-import dill as pickle
+from data.store import load_dataset
 
 optimizer_map = {
     "Adagrad": tf.compat.v1.train.AdagradOptimizer,
@@ -124,7 +124,7 @@ def create_output(features, params, mode):
     label_vocabulary = (
         params["label_vocabulary"] if "label_vocabulary" in params else None
     )
-    dataset = pickle.load(open(params["data_path"], "rb"))
+    dataset = load_dataset(params["data_path"])
 
     if params["mode"] == "custom":
         if hasattr(dataset, "get_feature_columns"):
@@ -1,4 +1,3 @@
-import dill as pickle
 import ntpath
 from abc import ABCMeta
 
@@ -13,9 +12,13 @@ import inspect
 from GPUtil import GPUtil
 
 from system.data.tabular import Tabular
+from data.store import load_dataset
 from .model_builder import ModelBuilder
+from .predictor import SavedModelPredictor, find_export
 from ..extensions.best_exporter import BestExporter
 from ..explainer import TabularExplainer, ImageExplainer
+from ..metrics_store import MetricsStoreHook
+from ..oldutils.hooks import InputTimingHook
 
 # from system.oldutils.email_ops import send_email
 from system.utils.run_utils import check_exports
@@ -33,15 +36,18 @@ SAVE_CHECKPOINTS_STEPS = "save_checkpoints_steps"
 
 class AbstractEstimator(metaclass=ABCMeta):
     def __init__(self, params):
-        self.dataset = pickle.load(open(params["data_path"], "rb"))
+        self.dataset = load_dataset(params["data_path"])
         self.params = params
         self.checkpoint_dir = params["checkpoint_dir"]
         # self.feature_columns = self.dataset.get_feature_columns()
         # self.feature_names = feature_util.get_feature_names(self.feature_columns)
         self.model = None
-        self.max_steps = np.ceil(
-            self.dataset.get_train_size() / int(params["batch_size"])
-        ) * int(params["num_epochs"])
+        self.predictor = None
+        self.explainer = None
+        self.steps_per_epoch = int(
+            np.ceil(self.dataset.get_train_size() / int(params["batch_size"]))
+        )
+        self.max_steps = self.steps_per_epoch * int(params["num_epochs"])
         self.test_file = ""
 
         tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.DEBUG)
@@ -58,7 +64,7 @@ class AbstractEstimator(metaclass=ABCMeta):
         log.addHandler(fh)
 
         tf.reset_default_graph()
-        if len(check_exports(params["export_dir"])) == 0:
+        if not params.get("resume") and len(check_exports(params["export_dir"])) == 0:
             self.clear_checkpoint()
 
         self._create_run_config()
@@ -77,7 +83,7 @@ class AbstractEstimator(metaclass=ABCMeta):
             for s in inspect.stack()
             if ntpath.basename(s.filename) == "thread_handler.py"
                and s.function
-               in ["run_thread", "predict_thread", "explain_thread", "predict_test_thread"]
+               in ["estimator_worker", "training_job"]
         ][-1]
 
         if f == "predict" or (f != "run" and len(GPUtil.getAvailable()) == 0):
@@ -106,7 +112,14 @@ class AbstractEstimator(metaclass=ABCMeta):
     def _create_specs(self):
 
         self.train_spec = tf.estimator.TrainSpec(
-            input_fn=self._train_input_fn, max_steps=self.max_steps
+            input_fn=self._train_input_fn,
+            max_steps=self.max_steps,
+            hooks=[
+                MetricsStoreHook(
+                    self.checkpoint_dir, self.params[SAVE_SUMMARY_STEPS]
+                ),
+                InputTimingHook(self.steps_per_epoch),
+            ],
         )
 
         self.eval_spec = tf.estimator.EvalSpec(
@@ -136,11 +149,26 @@ class AbstractEstimator(metaclass=ABCMeta):
     def clear_checkpoint(self):
         shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
 
+    def get_predictor(self):
+        if self.predictor is None:
+            export_path = find_export(self.checkpoint_dir, self.params["export_dir"])
+            if export_path is not None:
+                self.predictor = SavedModelPredictor(export_path)
+        return self.predictor
+
+    def predict_batch(self, features):
+        predictor = self.get_predictor()
+        if predictor is not None:
+            return predictor.predict(features)
+        # nothing exported yet, fall back to restoring the checkpoint
+        predict_input_fn = tf.estimator.inputs.numpy_input_fn(
+            x=features, y=None, num_epochs=1, shuffle=False
+        )
+        return list(self.model.predict(input_fn=predict_input_fn))
+
     def predict(self, features, all=False):
 
-        predictions = list(
-            self.model.predict(input_fn=self.dataset.input_predict_fn(features))
-        )
+        predictions = self.predict_batch(self.dataset.predict_features(features))
         if all:
             return predictions
         if "predictions" in predictions[0].keys():
@@ -149,10 +177,13 @@ class AbstractEstimator(metaclass=ABCMeta):
 
     def predict_test(self, test_file):
         self.test_file = test_file
-        dict_results = {}
         # TODO maybe check if gpu is free
+        return self._format_predictions(
+            self.predict_batch(self.dataset.test_features(test_file))
+        )
 
-        predictions = list(self.model.predict(input_fn=self._test_input_fn))
+    def _format_predictions(self, predictions):
+        dict_results = {}
         if "predictions" in predictions[0].keys():
             preds = [x["predictions"][0] for x in predictions]
             dict_results["preds"] = preds
@@ -175,11 +206,20 @@ class AbstractEstimator(metaclass=ABCMeta):
             else ImageExplainer(self.dataset)
         )
 
+    def predict_frame(self, df):
+        """Predicts a DataFrame (or Arrow table) of rows without temporary files."""
+        return self._format_predictions(
+            self.predict_batch(self.dataset.batch_features(df))
+        )
+
+    def get_explainer(self):
+        if self.explainer is None:
+            self.explainer = self._create_explainer()
+        return self.explainer
+
     def explain(self, **params):
-        explainer = self._create_explainer()
         # TODO explain on cpu, maybe check if gpu is free
-
-        return explainer.explain_instance(self.model, **params)
+        return self.get_explainer().explain_instance(self.predict_batch, **params)
 
 
 class Estimator(AbstractEstimator):
@@ -200,9 +240,7 @@ class MultOutEstimator(AbstractEstimator):
         super().__init__(params)
 
     def predict(self, features, all=False):
-        predictions = list(
-            self.model.predict(input_fn=self.dataset.input_predict_fn(features))
-        )
+        predictions = self.predict_batch(self.dataset.predict_features(features))
 
         if all:
             return predictions
@@ -210,10 +248,12 @@ class MultOutEstimator(AbstractEstimator):
 
     def predict_test(self, test_file):
         self.test_file = test_file
-        dict_results = {}
-        predictions = list(self.model.predict(input_fn=self._test_input_fn))
-        dict_results["preds"] = [x["predictions"] for x in predictions]
-        return dict_results
+        return self._format_predictions(
+            self.predict_batch(self.dataset.test_features(test_file))
+        )
+
+    def _format_predictions(self, predictions):
+        return {"preds": [x["predictions"] for x in predictions]}
 
     def _create_model(self):
         self.params["label_dimension"] = len(self.dataset.get_targets())
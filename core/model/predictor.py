@@ -0,0 +1,108 @@
+import math
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from oldutils.run_utils import check_exports
+
+SAVED_MODEL_FILE = "saved_model.pb"
+
+PREDICT_BATCH_SIZE = 1024
+
+
+def find_export(checkpoint_dir, export_dir):
+    """Returns the SavedModel directory to serve predictions from.
+
+    ``checkpoint_dir`` points at an export when a checkpoint was selected
+    from the results table; otherwise the export with the lowest loss in
+    ``export.log`` is used. Returns None if nothing has been exported yet.
+    """
+    if os.path.isfile(os.path.join(checkpoint_dir, SAVED_MODEL_FILE)):
+        return checkpoint_dir
+
+    best_path = None
+    min_loss = math.inf
+    for path, metrics in check_exports(export_dir).items():
+        if not os.path.isfile(os.path.join(path, SAVED_MODEL_FILE)):
+            continue
+        loss = metrics["average_loss"] if "average_loss" in metrics else metrics["loss"]
+        if loss < min_loss:
+            min_loss = loss
+            best_path = path
+    return best_path
+
+
+class SavedModelPredictor:
+    """Keeps an exported SavedModel loaded in one session.
+
+    Returns the same per-example dictionaries as ``Estimator.predict`` but
+    without rebuilding the graph and restoring the checkpoint on each call.
+    """
+
+    def __init__(self, export_path, batch_size=PREDICT_BATCH_SIZE):
+        self.export_path = export_path
+        self._batch_size = batch_size
+        self._graph = tf.Graph()
+
+        config = tf.compat.v1.ConfigProto(device_count={"GPU": 0})
+        self._session = tf.compat.v1.Session(graph=self._graph, config=config)
+        meta_graph = tf.compat.v1.saved_model.loader.load(
+            self._session, [tf.saved_model.SERVING], export_path
+        )
+        signature = meta_graph.signature_def[
+            tf.saved_model.DEFAULT_SERVING_SIGNATURE_DEF_KEY
+        ]
+        self._inputs = {
+            k: self._graph.get_tensor_by_name(v.name)
+            for k, v in signature.inputs.items()
+        }
+        self._outputs = {
+            k: self._graph.get_tensor_by_name(v.name)
+            for k, v in signature.outputs.items()
+        }
+
+    def get_input_names(self):
+        return list(self._inputs.keys())
+
+    def _feed_dict(self, features, start, end):
+        if not isinstance(features, dict):
+            # image models expose a single input tensor
+            tensor = next(iter(self._inputs.values()))
+            return {tensor: features[start:end]}
+
+        feed_dict = {}
+        for name, tensor in self._inputs.items():
+            values = np.asarray(features[name])[start:end]
+            if tensor.shape.ndims == 2:
+                values = values.reshape(-1, 1)
+            if values.dtype == object:
+                values = values.astype(str)
+            feed_dict[tensor] = values
+        return feed_dict
+
+    def predict_arrays(self, features):
+        """Runs the model over a batch and returns a dict of stacked outputs."""
+        num_rows = (
+            len(next(iter(features.values())))
+            if isinstance(features, dict)
+            else len(features)
+        )
+        results = {k: [] for k in self._outputs}
+        for start in range(0, num_rows, self._batch_size):
+            end = min(start + self._batch_size, num_rows)
+            outputs = self._session.run(
+                self._outputs, feed_dict=self._feed_dict(features, start, end)
+            )
+            for k, v in outputs.items():
+                results[k].append(v)
+        return {k: np.concatenate(v) for k, v in results.items()}
+
+    def predict(self, features):
+        """Same output format as ``list(Estimator.predict(...))``."""
+        outputs = self.predict_arrays(features)
+        num_rows = len(next(iter(outputs.values())))
+        return [{k: v[i] for k, v in outputs.items()} for i in range(num_rows)]
+
+    def close(self):
+        self._session.close()
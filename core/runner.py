@@ -1,14 +1,14 @@
-import dill as pickle
-
+from data.store import load_dataset
 from .model.estimator import MultOutEstimator, Estimator
 from tensorflow.python.framework.errors import InvalidArgumentError, NotFoundError
 
 
 class Runner:
-    def __init__(self, config):
-        self.dataset = pickle.load(open(config.data_path(), "rb"))
+    def __init__(self, config, resume=False):
+        self.dataset = load_dataset(config.data_path())
 
         self.config = config
+        self.resume = resume
         self.estimator = None
         self.create_estimator()
 
@@ -20,6 +20,8 @@ class Runner:
         config_params.update(params)
         if hasattr(self.config, "canned_data"):
             config_params["canned_data"] = self.config.get_canned_data()
+        if self.resume:
+            config_params["resume"] = True
 
         if len(self.dataset.get_targets()) == 1:
             self.estimator = Estimator(config_params)
@@ -65,6 +67,19 @@ class Runner:
         except Exception as err:
             return str(err), False
 
+    def predict_frame(self, df):
+        try:
+            return self.get_estimator().predict_frame(df), True
+        except (InvalidArgumentError, NotFoundError) as err:
+            if err.message.split(".")[0] != "Restoring from checkpoint failed":
+                return err.message, False
+            return (
+                "Model's structure does not match the new parameter configuration",
+                False,
+            )
+        except Exception as err:
+            return str(err), False
+
     def explain(self, params):
         try:
             if not isinstance(self.get_estimator(), MultOutEstimator):
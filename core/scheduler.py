@@ -0,0 +1,448 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from multiprocessing import Process
+
+import psutil
+
+DB_PATH = os.path.join(os.getcwd(), "training_jobs.db")
+
+MAX_CONCURRENT_JOBS = 2
+
+JOB_CPU_THREADS = 2
+
+JOB_MEMORY_LIMIT_MB = 4096
+
+SCHEDULER_POLL_INTERVAL = 1
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+FINISHED = "finished"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# added after the first release, created on existing databases
+_PROCESS_COLUMNS = [
+    ("pid_created", "REAL"),
+    ("owner_pid", "INTEGER"),
+    ("owner_created", "REAL"),
+]
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _kill_tree(pid):
+    try:
+        parent = psutil.Process(pid)
+    except psutil.NoSuchProcess:
+        return
+    for child in parent.children(recursive=True):
+        child.kill()
+    parent.kill()
+
+
+def _create_time(pid):
+    try:
+        return psutil.Process(pid).create_time()
+    except psutil.NoSuchProcess:
+        return None
+
+
+def _process_alive(pid, created):
+    """Whether ``pid`` still runs the process started at ``created``.
+
+    The create time guards against the pid having been reused.
+    """
+    if not pid or not psutil.pid_exists(pid):
+        return False
+    if created is None:
+        return True
+    current = _create_time(pid)
+    return current is not None and abs(current - created) < 1
+
+
+def _tree_memory_mb(pid):
+    try:
+        parent = psutil.Process(pid)
+        processes = [parent] + parent.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+    except psutil.NoSuchProcess:
+        return 0
+
+
+class TrainingScheduler:
+    """Queue of training jobs run with bounded concurrency and resources.
+
+    Jobs are persisted in SQLite so the queue survives restarts. At most
+    ``max_concurrent_jobs`` run at once, each pinned to its own
+    ``cpu_threads`` CPUs and stopped if its process tree uses more than
+    ``memory_limit_mb``. When a slot frees up, the oldest queued job of
+    the user with the fewest running jobs is started. Pausing stops the
+    process; resuming queues it again and training continues from the
+    last checkpoint in ``checkpoint_dir``. Several app processes may share
+    the table: jobs are claimed atomically and the limits apply to all
+    running rows.
+    """
+
+    def __init__(
+        self,
+        db_path=DB_PATH,
+        max_concurrent_jobs=MAX_CONCURRENT_JOBS,
+        cpu_threads=JOB_CPU_THREADS,
+        memory_limit_mb=JOB_MEMORY_LIMIT_MB,
+    ):
+        self._db_path = db_path
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.cpu_threads = cpu_threads
+        self.memory_limit_mb = memory_limit_mb
+        self._lock = threading.RLock()
+        self._created = _create_time(os.getpid())
+        self._processes = {}  # job id -> Process started by this app process
+        self._init_db()
+        self._requeue_interrupted()
+
+        self._thread = threading.Thread(
+            target=self._loop, name="training-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self._db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT NOT NULL,
+                    config_file TEXT NOT NULL,
+                    options TEXT,
+                    status TEXT NOT NULL,
+                    submitted_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    pid INTEGER,
+                    cpus TEXT,
+                    error TEXT
+                )
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in _PROCESS_COLUMNS:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def _requeue_interrupted(self):
+        """Requeues running jobs whose owning app process is gone.
+
+        Jobs of a live app process are reaped by that process. Otherwise a
+        training process that is still alive (an orphan) is killed, and the
+        job resumes from its checkpoints. Checked on every poll.
+        """
+        for job in self._running_jobs():
+            if job["id"] in self._processes:
+                continue
+            owner = job["owner_pid"]
+            if (
+                owner
+                and owner != os.getpid()
+                and _process_alive(owner, job["owner_created"])
+            ):
+                continue
+            if _process_alive(job["pid"], job["pid_created"]):
+                _kill_tree(job["pid"])
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, pid = NULL, pid_created = NULL, "
+                    "cpus = NULL, owner_pid = NULL, owner_created = NULL "
+                    "WHERE id = ? AND status = ? AND owner_pid IS ?",
+                    (QUEUED, job["id"], RUNNING, owner),
+                )
+            logging.debug(f"Requeued interrupted training job {job['id']}")
+
+    def _update(self, job_id, **fields):
+        columns = ", ".join(f"{k} = ?" for k in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id)
+            )
+
+    def _jobs(self, where="", params=()):
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM jobs {where} ORDER BY submitted_at", params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def submit(self, username, config_file, options=None):
+        """Queues a training job; an active job for the same model is reused.
+
+        ``options`` (canned data, email, ...) are stored with the job and
+        applied to the configuration read from ``config_file`` at start.
+        """
+        with self._lock:
+            active = self._jobs(
+                "WHERE username = ? AND config_file = ? AND status IN (?, ?)",
+                (username, config_file, *ACTIVE_STATES),
+            )
+            if active:
+                return active[0]["id"]
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO jobs "
+                    "(username, config_file, options, status, submitted_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        username,
+                        config_file,
+                        json.dumps(options or {}),
+                        QUEUED,
+                        time.time(),
+                    ),
+                )
+                job_id = cursor.lastrowid
+        self.schedule()
+        return job_id
+
+    def _stop(self, job_id, status, error=None):
+        with self._lock:
+            process = self._processes.pop(job_id, None)
+            if process is not None:
+                if process.is_alive():
+                    _kill_tree(process.pid)
+            else:
+                # started by another app process
+                job = self.get_job(job_id)
+                if job is not None and _process_alive(job["pid"], job["pid_created"]):
+                    _kill_tree(job["pid"])
+            self._update(
+                job_id,
+                status=status,
+                finished_at=time.time(),
+                pid=None,
+                pid_created=None,
+                cpus=None,
+                owner_pid=None,
+                owner_created=None,
+                error=error,
+            )
+
+    def pause(self, job_id):
+        job = self.get_job(job_id)
+        if job is None or job["status"] not in ACTIVE_STATES:
+            return False
+        self._stop(job_id, PAUSED)
+        self.schedule()
+        return True
+
+    def resume(self, job_id):
+        job = self.get_job(job_id)
+        if job is None or job["status"] not in (PAUSED, FAILED):
+            return False
+        self._update(
+            job_id,
+            status=QUEUED,
+            submitted_at=time.time(),
+            finished_at=None,
+            error=None,
+        )
+        self.schedule()
+        return True
+
+    def cancel(self, job_id):
+        job = self.get_job(job_id)
+        if job is None or job["status"] in (FINISHED, CANCELLED):
+            return False
+        self._stop(job_id, CANCELLED)
+        self.schedule()
+        return True
+
+    def pause_user(self, username):
+        for job in self._jobs(
+            "WHERE username = ? AND status IN (?, ?)", (username, *ACTIVE_STATES)
+        ):
+            self.pause(job["id"])
+
+    def get_job(self, job_id):
+        jobs = self._jobs("WHERE id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def get_active_job(self, username):
+        jobs = self._jobs(
+            "WHERE username = ? AND status IN (?, ?)", (username, *ACTIVE_STATES)
+        )
+        return jobs[-1] if jobs else None
+
+    def status(self, username=None):
+        """Jobs (optionally of one user) with queue position and resource use."""
+        queued = [j["id"] for j in self._next_jobs(self._queued_jobs())]
+        where, params = ("WHERE username = ?", (username,)) if username else ("", ())
+        jobs = self._jobs(where, params)
+        for job in jobs:
+            job["options"] = None  # may contain e-mails / model data
+            job["queue_position"] = (
+                queued.index(job["id"]) + 1 if job["id"] in queued else None
+            )
+            job["memory_mb"] = None
+            if job["status"] == RUNNING and job["pid"]:
+                job["memory_mb"] = round(_tree_memory_mb(job["pid"]), 1)
+        return {
+            "jobs": jobs,
+            "running": len(self._running_jobs()),
+            "max_concurrent_jobs": self.max_concurrent_jobs,
+        }
+
+    def _queued_jobs(self):
+        return self._jobs("WHERE status = ?", (QUEUED,))
+
+    def _running_jobs(self):
+        # every app process schedules from the same table, so limits are
+        # taken from the running rows rather than from self._processes
+        return self._jobs("WHERE status = ?", (RUNNING,))
+
+    def _next_jobs(self, queued):
+        """Queued jobs in start order: users with fewer running jobs go first."""
+        running = {}
+        for job in self._jobs("WHERE status = ?", (RUNNING,)):
+            running[job["username"]] = running.get(job["username"], 0) + 1
+        order = []
+        queued = list(queued)
+        while queued:
+            job = min(
+                queued, key=lambda j: (running.get(j["username"], 0), j["submitted_at"])
+            )
+            queued.remove(job)
+            running[job["username"]] = running.get(job["username"], 0) + 1
+            order.append(job)
+        return order
+
+    def _free_cpus(self, running):
+        used = {int(c) for job in running if job["cpus"] for c in job["cpus"].split(",")}
+        return [c for c in sorted(os.sched_getaffinity(0)) if c not in used]
+
+    def _job_cpus(self):
+        return min(self.cpu_threads, len(os.sched_getaffinity(0)))
+
+    def _claim(self, job):
+        """Atomically marks a queued job as running and reserves its CPUs.
+
+        Returns the CPUs, ``None`` when no slot or CPUs are free and
+        ``False`` when another app process claimed the job first.
+        """
+        conn = self._connect()
+        conn.isolation_level = None
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            running = [
+                dict(row)
+                for row in conn.execute(
+                    "SELECT cpus FROM jobs WHERE status = ?", (RUNNING,)
+                )
+            ]
+            cpus = self._free_cpus(running)[: self._job_cpus()]
+            if len(running) >= self.max_concurrent_jobs or len(cpus) < self._job_cpus():
+                conn.execute("ROLLBACK")
+                return None
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, cpus = ?, "
+                "owner_pid = ?, owner_created = ? "
+                "WHERE id = ? AND status = ?",
+                (
+                    RUNNING,
+                    time.time(),
+                    ",".join(map(str, cpus)),
+                    os.getpid(),
+                    self._created,
+                    job["id"],
+                    QUEUED,
+                ),
+            )
+            conn.execute("COMMIT")
+            return cpus if cursor.rowcount == 1 else False
+        finally:
+            conn.close()
+
+    def _start(self, job, cpus):
+        from .thread_handler import training_job
+
+        process = Process(
+            target=training_job,
+            args=(
+                job["config_file"],
+                json.loads(job["options"] or "{}"),
+                cpus,
+                # paused or interrupted jobs keep their checkpoints
+                job["started_at"] is not None,
+            ),
+            name="run",
+        )
+        process.daemon = True
+        try:
+            process.start()
+        except Exception:
+            self._update(job["id"], status=QUEUED, pid=None, cpus=None)
+            raise
+        self._processes[job["id"]] = process
+        self._update(job["id"], pid=process.pid, pid_created=_create_time(process.pid))
+        logging.debug(f"Started training job {job['id']} on cpus {cpus}")
+
+    def _reap(self):
+        for job_id, process in list(self._processes.items()):
+            job = self.get_job(job_id)
+            if job is None or job["status"] != RUNNING or job["pid"] != process.pid:
+                # paused, cancelled or restarted through another app process
+                self._processes.pop(job_id)
+                if process.is_alive():
+                    _kill_tree(process.pid)
+            elif not process.is_alive():
+                status = FINISHED if process.exitcode == 0 else FAILED
+                error = None if status == FINISHED else f"exit code {process.exitcode}"
+                self._stop(job_id, status, error)
+            elif _tree_memory_mb(process.pid) > self.memory_limit_mb:
+                error = f"memory limit of {self.memory_limit_mb} MB exceeded"
+                self._stop(job_id, FAILED, error)
+
+    def schedule(self):
+        with self._lock:
+            self._reap()
+            self._requeue_interrupted()
+            for job in self._next_jobs(self._queued_jobs()):
+                cpus = self._claim(job)
+                if cpus is None:
+                    break
+                if cpus is not False:
+                    self._start(job, cpus)
+
+    def _loop(self):
+        while True:
+            try:
+                self.schedule()
+            except Exception as e:
+                logging.error(f"Training scheduler error: {e}")
+            time.sleep(SCHEDULER_POLL_INTERVAL)
+
+
+def get_scheduler():
+    """Process wide scheduler, limits are read from the [TRAINING] app config."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from app_config.config_wrapper import ConfigApp
+
+            app_config = ConfigApp()
+            _scheduler = TrainingScheduler(
+                max_concurrent_jobs=app_config.max_concurrent_jobs(),
+                cpu_threads=app_config.job_cpu_threads(),
+                memory_limit_mb=app_config.job_memory_limit_mb(),
+            )
+        return _scheduler
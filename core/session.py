@@ -1,32 +1,43 @@
 from config.config_writer import ConfigWriter
 from config import config_reader
 
-from data.tabular import Tabular as DataTabular
-from data.image import Image as DataImage
-
 from flask import session, redirect, url_for
-from .helper import Tabular, Image
+from .session_store import SessionStore
 
-import dill as pickle
 import os
 import pandas as pd
 
 
 class Session:
     def __init__(self, app, appConfig):
-        self._config_writer = {}
-        self._config = {}
         self._app = app
         self._appConfig = appConfig
-        self._helper = None
+        self._store = SessionStore(
+            max_users=appConfig.session_max_users(),
+            ttl=appConfig.session_ttl_minutes() * 60,
+            memory_limit_mb=appConfig.session_memory_limit_mb(),
+            spill_threshold_mb=appConfig.session_spill_threshold_mb(),
+            writer_factory=ConfigWriter,
+        )
+
+    def _state(self):
+        return self._store.user(self.get_session())
 
     def get_helper(self):
-        return self._helper
+        return self._state().helper
 
     def set_helper(self, helper):
-        self._helper = helper
+        self._store.set_helper(self.get_session(), helper)
+
+    def get_memory_stats(self):
+        return self._store.stats()
 
     def create_helper(self, dataset):
+        # the dataset classes pull in TensorFlow, import them on first use
+        from data.tabular import Tabular as DataTabular
+        from data.image import Image as DataImage
+        from .helper import Tabular, Image
+
         if isinstance(dataset, DataTabular):
             helper = Tabular(dataset, self._appConfig)
             self.set_helper(helper)
@@ -35,14 +46,10 @@ class Session:
             self.set_helper(helper)
 
     def add_user(self, user):
-        self._config[user] = {}
-        self._config_writer[user] = ConfigWriter()
+        self._store.reset(user)
 
     def reset_user(self):
-        user = self.get_session()
-        self._config[user] = {}
-        self._config_writer[user] = ConfigWriter()
-        self._helper = None
+        self._store.reset(self.get_session())
 
     def get_session(self):
         with self._app.app_context():
@@ -51,11 +58,10 @@ class Session:
             return session["user"]
 
     def get(self, key):
-        return self.get_config()[key]
+        return self._state().get(key)
 
     def remove(self, key):
-        if key in self.get_config():
-            del self.get_config()[key]
+        self._state().remove(key)
 
     def set_dict_graphs(self, dict_graphs):
         self.set("dict_graphs", dict_graphs)
@@ -103,12 +109,11 @@ class Session:
         self.set("predict_file", predict_file)
 
     def get_config(self):
-        user = self.get_session()
-        return self._config[user]
+        """Keys of the user's session values, values are read with ``get``."""
+        return self._state().keys()
 
     def get_writer(self):
-        user = self.get_session()
-        return self._config_writer[user]
+        return self._state().writer
 
     def get_custom_path(self):
         return self.get("custom_path")
@@ -139,8 +144,7 @@ class Session:
         return self.get("status")
 
     def set(self, key, value):
-        user = self.get_session()
-        self._config[user][key] = value
+        self._store.set(self.get_session(), key, value)
 
     def set_model_name(self, model_name):
         self.set("model_name", model_name)
@@ -202,8 +206,7 @@ class Session:
         self.set("generated_df", df)
 
     def update_writer_conf(self, conf):
-        user = self.get_session()
-        self._config_writer[user].config = conf
+        self.get_writer().config = conf
 
     def load_config(self):
         # read saved config
@@ -211,7 +214,9 @@ class Session:
 
         # update files and df in config dict
         if "PATHS" in conf.keys():
-            dataset = pickle.load(open(conf["PATHS"]["data_path"], "rb"))
+            from data.store import load_dataset
+
+            dataset = load_dataset(conf["PATHS"]["data_path"])
             self.create_helper(dataset)
             self.update_writer_conf(conf)
             return True
@@ -244,9 +249,11 @@ class Session:
         self.set("cy_model", request["cy_model"])
 
     def write_params(self):
+        from data.store import DATASET_EXTENSION
+
         hlp = self.get_helper()  # TODO
         data_path = os.path.join(
-            os.path.dirname(self.get_config_file()), hlp.get_dataset_name() + ".pkl"
+            os.path.dirname(self.get_config_file()), hlp.get_dataset_name() + DATASET_EXTENSION
         )
         self.set_data_path(data_path)
         self.get_writer().add_item("PATHS", "data_path", data_path)
@@ -0,0 +1,283 @@
+import io
+import logging
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MAX_USERS = 100
+
+SESSION_TTL_SECONDS = 2 * 60 * 60
+
+MEMORY_LIMIT_MB = 1024
+
+SPILL_THRESHOLD_MB = 8
+
+SPILL_DIR = os.path.join(tempfile.gettempdir(), "session_store")
+
+# seconds between two walks of the helper graph on session writes
+HELPER_MEASURE_INTERVAL = 30
+
+
+# attribute levels followed from a session value, keeps third party object
+# graphs (TensorFlow, SQLAlchemy, ...) out of the walk
+SIZE_DEPTH = 6
+
+_UNSIZED = (type, types.ModuleType, types.FunctionType, types.MethodType, io.IOBase)
+
+
+def _size_of(value):
+    """Approximate memory held by ``value`` and the objects it references.
+
+    Containers and object attributes (helpers, datasets) are followed up to
+    ``SIZE_DEPTH`` levels, each object is counted once. Memory mapped
+    arrays are backed by their files and are not counted.
+    """
+    size = 0
+    seen = set()
+    stack = [(value, 0)]
+    while stack:
+        obj, depth = stack.pop()
+        if id(obj) in seen or isinstance(obj, _UNSIZED):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            base = obj
+            while isinstance(base, np.ndarray) and base.base is not None:
+                base = base.base
+            if not isinstance(obj, np.memmap) and not isinstance(base, mmap.mmap):
+                size += obj.nbytes if obj.dtype != object else sys.getsizeof(obj)
+            continue
+        if isinstance(obj, (pd.DataFrame, pd.Series)):
+            usage = obj.memory_usage(deep=True)
+            size += int(usage.sum() if isinstance(obj, pd.DataFrame) else usage)
+            continue
+        size += sys.getsizeof(obj)
+        if depth == SIZE_DEPTH:
+            continue
+        if isinstance(obj, dict):
+            children = [*obj.keys(), *obj.values()]
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            children = obj
+        elif hasattr(obj, "__dict__"):
+            children = [vars(obj)]
+        else:
+            continue
+        stack.extend((child, depth + 1) for child in children)
+    return size
+
+
+class SessionEvicted(Exception):
+    """The state of ``user`` was evicted, the user has to log in again."""
+
+    def __init__(self, user):
+        super().__init__(f"Session state of {user} was evicted")
+        self.user = user
+
+
+class _Spilled:
+    """Placeholder of a value written to disk."""
+
+    def __init__(self, path, kind):
+        self.path = path
+        self.kind = kind
+
+    def load(self):
+        if self.kind == "frame":
+            return pq.read_table(self.path, memory_map=True).to_pandas()
+        # copy on write, callers may modify the array in place
+        return np.load(self.path, mmap_mode="c")
+
+
+class UserState:
+    """Session values, config writer and helper of one user."""
+
+    def __init__(self, spill_dir, writer=None):
+        self.values = {}
+        self.sizes = {}
+        self.writer = writer
+        self.helper = None
+        self.helper_size = 0
+        self.helper_measured = 0
+        self.last_access = time.time()
+        self._spill_dir = spill_dir
+
+    def memory(self):
+        return sum(self.sizes.values()) + self.helper_size
+
+    def measure_helper(self):
+        # the helper holds the dataset, which loads its frames lazily
+        self.helper_size = _size_of(self.helper) if self.helper is not None else 0
+        self.helper_measured = time.monotonic()
+
+    def _spill(self, key, value):
+        os.makedirs(self._spill_dir, exist_ok=True)
+        name = os.path.join(self._spill_dir, uuid.uuid4().hex)
+        try:
+            if isinstance(value, pd.DataFrame):
+                path = name + ".parquet"
+                pq.write_table(pa.Table.from_pandas(value), path)
+                return _Spilled(path, "frame")
+            if isinstance(value, np.ndarray) and value.dtype != object:
+                path = name + ".npy"
+                np.save(path, value)
+                return _Spilled(path, "array")
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            logging.debug(f"Keeping session value {key} in memory: {e}")
+        return None
+
+    def set(self, key, value, spill_threshold):
+        if self.values.get(key) is not value:
+            self.remove(key)
+        size = _size_of(value)
+        if size >= spill_threshold:
+            spilled = self._spill(key, value)
+            if spilled is not None:
+                self.values[key] = spilled
+                return
+        self.values[key] = value
+        self.sizes[key] = size
+
+    def get(self, key):
+        value = self.values[key]
+        if isinstance(value, _Spilled):
+            return value.load()
+        return value
+
+    def remove(self, key):
+        value = self.values.pop(key, None)
+        self.sizes.pop(key, None)
+        if isinstance(value, _Spilled):
+            try:
+                os.remove(value.path)
+            except FileNotFoundError:
+                pass
+        elif isinstance(value, io.IOBase):
+            value.close()
+
+    def keys(self):
+        return self.values.keys()
+
+    def clear(self):
+        for key in list(self.values):
+            self.remove(key)
+        self.helper = None
+        self.helper_size = 0
+
+
+class SessionStore:
+    """Per user session state with bounded memory.
+
+    Users are kept in least recently used order. States idle for longer
+    than ``ttl`` seconds, and the least recently used ones past
+    ``max_users`` or ``memory_limit_mb``, are evicted; accessing an evicted
+    user raises ``SessionEvicted`` until it is ``reset``. Values larger than
+    ``spill_threshold_mb`` (DataFrames as Parquet, arrays as ``.npy``) are
+    written to ``spill_dir`` and read back memory mapped on access.
+    """
+
+    def __init__(
+        self,
+        max_users=MAX_USERS,
+        ttl=SESSION_TTL_SECONDS,
+        memory_limit_mb=MEMORY_LIMIT_MB,
+        spill_threshold_mb=SPILL_THRESHOLD_MB,
+        spill_dir=SPILL_DIR,
+        writer_factory=None,
+    ):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.spill_threshold = spill_threshold_mb * 1024 * 1024
+        self._spill_dir = os.path.join(spill_dir, uuid.uuid4().hex)
+        self._writer_factory = writer_factory
+        self._users = OrderedDict()
+        self._evicted = set()
+        self._lock = threading.RLock()
+
+    def _new_state(self, user):
+        writer = self._writer_factory() if self._writer_factory else None
+        return UserState(os.path.join(self._spill_dir, str(hash(user))), writer)
+
+    def user(self, user):
+        """State of ``user``, created empty if missing.
+
+        Raises:
+            SessionEvicted: the state expired or was evicted to free memory
+        """
+        with self._lock:
+            state = self._users.get(user)
+            if state is not None and time.time() - state.last_access > self.ttl:
+                self._evict(user)
+                state = None
+            if state is None:
+                if user in self._evicted:
+                    raise SessionEvicted(user)
+                state = self._users[user] = self._new_state(user)
+            state.last_access = time.time()
+            self._users.move_to_end(user)
+            return state
+
+    def reset(self, user):
+        with self._lock:
+            if user in self._users:
+                self._evict(user)
+            self._evicted.discard(user)
+            return self.user(user)
+
+    def set(self, user, key, value):
+        with self._lock:
+            state = self.user(user)
+            state.set(key, value, self.spill_threshold)
+            # the helper loads its frames lazily, re-measure it now and then
+            if time.monotonic() - state.helper_measured > HELPER_MEASURE_INTERVAL:
+                state.measure_helper()
+            self._enforce_limits()
+
+    def set_helper(self, user, helper):
+        with self._lock:
+            state = self.user(user)
+            state.helper = helper
+            state.measure_helper()
+            self._enforce_limits()
+
+    def memory(self):
+        with self._lock:
+            return sum(state.memory() for state in self._users.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "memory_mb": round(self.memory() / (1024 * 1024), 1),
+                "memory_limit_mb": self.memory_limit / (1024 * 1024),
+            }
+
+    def _evict(self, user):
+        self._evicted.add(user)
+        state = self._users.pop(user)
+        state.clear()
+        shutil.rmtree(state._spill_dir, ignore_errors=True)
+        logging.debug(f"Evicted session state of {user}")
+
+    def _enforce_limits(self):
+        now = time.time()
+        for user, state in list(self._users.items()):
+            if now - state.last_access > self.ttl:
+                self._evict(user)
+        # the most recent user is kept even if it alone exceeds the limit
+        while len(self._users) > 1 and (
+            len(self._users) > self.max_users or self.memory() > self.memory_limit
+        ):
+            self._evict(next(iter(self._users)))
@@ -1,141 +1,274 @@
 from system.core.runner import Runner
 
+import os
+import queue
 import time
-import psutil
 from multiprocessing import Process, Queue
-from ..oldutils.sys_ops import find_free_port, change_checkpoints
+from ..oldutils.sys_ops import change_checkpoints
 from ..config import config_reader
+from .scheduler import get_scheduler, PAUSED
+from data.store import HEADER_FILE
 import threading
 import logging
-import subprocess
+from concurrent.futures import Future
 
 logging.basicConfig(
     level=logging.DEBUG,
     format="[%(levelname)s] (%(threadName)-10s) %(message)s",
 )
 
+MAX_WORKERS = 4
 
-class ThreadHandler:
-    def __init__(self):
-        self._processes = {}
-        self._ports = {}
-        self._return_queue = Queue()
+WORKER_IDLE_TIMEOUT = 30 * 60
+
+WORKER_START_TIMEOUT = 600
+
+
+def training_job(config_file, options, cpus, resume=False):
+    """Entry point of a scheduled training process.
 
-    def _get_runner(self, all_params_config):
+    The process is pinned to the CPUs reserved by the scheduler, so
+    TensorFlow sizes its thread pools to them. A resumed job continues from
+    the checkpoints in ``checkpoint_dir`` even if nothing was exported yet.
+    """
+    os.sched_setaffinity(0, cpus)
+    all_params_config = config_reader.read_config(config_file)
+    if "canned_data" in options:
+        all_params_config.set_canned_data(options["canned_data"])
+    if "email" in options:
+        all_params_config.set_email(options["email"])
+    Runner(all_params_config, resume=resume).run()
 
-        return Runner(all_params_config)
 
-    def add_port(self, username, config_file, port):
-        self._ports[username + "_" + config_file] = port
+def estimator_worker(all_params_config, requests, responses):
+    """Long-lived process that keeps one estimator loaded.
 
-    def get_port(self, username, config_file):
-        return self._ports[username + "_" + config_file]
+    The dataset is unpickled and the estimator built once; requests
+    ``(option, args)`` are then served from ``requests`` until a ``None``
+    sentinel arrives. Each result is put on ``responses``.
+    """
+    try:
+        runner = Runner(all_params_config)
+    except Exception as err:
+        responses.put((str(err), False))
+        return
+    responses.put(("ready", True))
 
-    def tensor_board_thread(self, config_file, port):
-        config_path = config_reader.read_config(config_file).all()["checkpoint_dir"]
-        logging.debug("Starting tensor board")
-        time.sleep(3)
-        pro = "tensorboard --host=0.0.0.0 --logdir=" + config_path + " --port=" + port
-        subprocess.call(pro, shell=True)
-        logging.debug("Exiting tensor board")
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        option, args = request
+        try:
+            responses.put(getattr(runner, option)(*args))
+        except Exception as err:
+            responses.put((str(err), False))
 
-    def run_tensor_board(self, username, config_file):
-        if not username + "_" + config_file in self._ports.keys():
+
+class EstimatorWorker:
+    def __init__(self, all_params_config, signature):
+        self.signature = signature
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+        self._requests = Queue()
+        self._responses = Queue()
+        self._process = Process(
+            target=estimator_worker,
+            args=(all_params_config, self._requests, self._responses),
+            name="estimator-worker",
+        )
+        self._process.daemon = True
+        self._process.start()
+        deadline = time.time() + WORKER_START_TIMEOUT
+        while True:
             try:
-                port = find_free_port()
-
-                self.add_port(username, config_file, port)
-                name = "tensorboard-" + str(port)
-                tboard_thread = threading.Thread(
-                    name=name, target=self.tensor_board_thread, args=(config_file, port)
-                )
-                tboard_thread.setDaemon(True)
-                tboard_thread.start()
-            except ValueError:
-                logging.error("No free port found.")
-
-    def run_thread(self, all_params_config):
-        runner = self._get_runner(all_params_config)
-        runner.run()
-
-    def predict_thread(self, all_params_config, new_features, all=False):
-        runner = self._get_runner(all_params_config)
-        self._return_queue.put(runner.predict(new_features, all))
-
-    def predict_test_thread(self, all_params_config, test_file):
-        runner = self._get_runner(all_params_config)
-        self._return_queue.put(runner.predict_test(test_file))
-
-    def explain_thread(self, all_params_config, explain_params):
-        runner = self._get_runner(all_params_config)
-        self._return_queue.put(runner.explain(explain_params))
+                message, ready = self._responses.get(timeout=1)
+                break
+            except queue.Empty:
+                if not self.is_alive():
+                    raise RuntimeError("Estimator worker exited during startup")
+                if time.time() > deadline:
+                    self.stop()
+                    raise RuntimeError(
+                        f"Estimator worker did not start in {WORKER_START_TIMEOUT}s"
+                    )
+        if not ready:
+            self._process.join()
+            raise RuntimeError(message)
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def request(self, option, *args):
+        with self.lock:
+            self.last_used = time.time()
+            self._requests.put((option, args))
+            while True:
+                try:
+                    return self._responses.get(timeout=1)
+                except queue.Empty:
+                    if not self.is_alive():
+                        return "Estimator worker exited unexpectedly", False
+
+    def stop(self):
+        if self.is_alive():
+            self._requests.put(None)
+            self._process.join(timeout=5)
+        if self.is_alive():
+            self._process.kill()
+
+
+class EstimatorWorkerPool:
+    """Pool of warm estimator workers keyed by model configuration.
+
+    A worker is recycled when the checkpoint it was started from changes,
+    and the least recently used worker is stopped when the pool is full.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, idle_timeout=WORKER_IDLE_TIMEOUT):
+        self._max_workers = max_workers
+        self._idle_timeout = idle_timeout
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(all_params_config):
+        return all_params_config.data_path(), all_params_config.checkpoint_dir()
+
+    @staticmethod
+    def get_signature(all_params_config):
+        data_path = all_params_config.data_path()
+        if os.path.isdir(data_path):
+            # write_dataset replaces the header last, after a complete write
+            data_path = os.path.join(data_path, HEADER_FILE)
+        signature = []
+        for path in [
+            os.path.join(all_params_config.checkpoint_dir(), "checkpoint"),
+            data_path,
+        ]:
+            signature.append(os.path.getmtime(path) if os.path.isfile(path) else None)
+        return tuple(signature)
+
+    def _started(self):
+        return {
+            key: worker
+            for key, worker in self._workers.items()
+            if isinstance(worker, EstimatorWorker)
+        }
+
+    def _evict(self):
+        now = time.time()
+        for key, worker in self._started().items():
+            if not worker.is_alive() or now - worker.last_used > self._idle_timeout:
+                worker.stop()
+                del self._workers[key]
+        started = self._started()
+        while started and len(self._workers) >= self._max_workers:
+            key = min(started, key=lambda k: started[k].last_used)
+            started.pop(key)
+            self._workers.pop(key).stop()
+
+    def get_worker(self, all_params_config):
+        """Warm worker of the model, started if missing or stale.
+
+        Workers are started outside the pool lock; concurrent requests for
+        a model that is still starting wait on its placeholder future.
+        """
+        key = self.get_key(all_params_config)
+        signature = self.get_signature(all_params_config)
+        with self._lock:
+            worker = self._workers.get(key)
+            if isinstance(worker, Future):
+                pending = worker
+            else:
+                if worker is not None and (
+                        worker.signature != signature or not worker.is_alive()
+                ):
+                    logging.debug("Recycling estimator worker for %s", key[1])
+                    self._workers.pop(key).stop()
+                    worker = None
+                if worker is not None:
+                    return worker
+                self._evict()
+                pending = None
+                future = self._workers[key] = Future()
+        if pending is not None:
+            return pending.result()
+
+        logging.debug("Starting estimator worker for %s", key[1])
+        try:
+            worker = EstimatorWorker(all_params_config, signature)
+        except Exception as err:
+            with self._lock:
+                if self._workers.get(key) is future:
+                    del self._workers[key]
+            future.set_exception(err)
+            raise
+        with self._lock:
+            if self._workers.get(key) is future:
+                self._workers[key] = worker
+        future.set_result(worker)
+        return worker
+
+    def request(self, all_params_config, option, *args):
+        try:
+            worker = self.get_worker(all_params_config)
+        except RuntimeError as err:
+            return str(err), False
+        return worker.request(option, *args)
+
+    def invalidate(self, data_path=None):
+        with self._lock:
+            for key in self._started():
+                if data_path is None or key[0] == data_path:
+                    self._workers.pop(key).stop()
+
+
+class ThreadHandler:
+    def __init__(self):
+        self._worker_pool = EstimatorWorkerPool()
+        self._scheduler = get_scheduler()
 
     def pause_threads(self, username):
-        p = (
-            self._processes[username]["process"]
-            if username in self._processes.keys()
-            else None
-        )
-        if not isinstance(p, str) and p:
-            pid = p.pid
-            parent = psutil.Process(pid)
-            for child in parent.children(recursive=True):
-                child.kill()
-            parent.kill()
-            del self._processes[username]
+        self._scheduler.pause_user(username)
+        return True
+
+    def resume_threads(self, username):
+        job = self._scheduler.get_active_job(username)
+        if job is None:
+            jobs = self._scheduler.status(username)["jobs"]
+            paused = [j for j in jobs if j["status"] == PAUSED]
+            return bool(paused) and self._scheduler.resume(paused[-1]["id"])
         return True
 
     def check_running(self, username):
-        if username in self._processes.keys():
-            return (
-                self._processes[username]["process"].is_alive(),
-                self._processes[username]["config_file"],
-            )
+        """(queued or running, config file) of the user's active training job."""
+        job = self._scheduler.get_active_job(username)
+        if job is not None:
+            return True, job["config_file"]
         return False, None
 
     def run_estimator(self, all_params_config, username, config_file):
-        r_thread = Process(
-            target=self.run_thread, args=(all_params_config,), name="run"
-        )
-        r_thread.daemon = True
-        r_thread.start()
-        self._processes[username] = {"process": r_thread, "config_file": config_file}
+        # training replaces the checkpoints the warm workers were built from
+        self._worker_pool.invalidate(all_params_config.data_path())
+        options = {}
+        if hasattr(all_params_config, "canned_data"):
+            options["canned_data"] = all_params_config.get_canned_data()
+        if all_params_config.has_option("PATHS", "email"):
+            options["email"] = all_params_config.get("PATHS", "email")
+        return self._scheduler.submit(username, config_file, options)
 
     def predict_estimator(self, all_params_config, features, all=False):
-        r_thread = Process(
-            target=self.predict_thread,
-            args=(all_params_config, features, all),
-            name="predict",
-        )
-        r_thread.daemon = True
-        r_thread.start()
-        final_pred = self._return_queue.get()
-        r_thread.join()
-        return final_pred
+        return self._worker_pool.request(all_params_config, "predict", features, all)
 
     def predict_test_estimator(self, all_params_config, features):
-        r_thread = Process(
-            target=self.predict_test_thread,
-            args=(all_params_config, features),
-            name="test",
-        )
-        r_thread.daemon = True
-        r_thread.start()
-        final_pred = self._return_queue.get()
-        r_thread.join()
-        return final_pred
+        return self._worker_pool.request(all_params_config, "predict_test", features)
+
+    def predict_frame_estimator(self, all_params_config, df):
+        return self._worker_pool.request(all_params_config, "predict_frame", df)
 
     def explain_estimator(self, all_params_config, explain_params):
-        r_thread = Process(
-            target=self.explain_thread,
-            args=(all_params_config, explain_params),
-            name="explain",
-        )
-        r_thread.daemon = True
-        r_thread.start()
-        exp = self._return_queue.get()
-        r_thread.join()
-        return exp
+        return self._worker_pool.request(all_params_config, "explain", explain_params)
 
     def handle_request(
             self, option, all_params_config, username, resume_from, config_file
@@ -146,5 +279,7 @@ class ThreadHandler:
             self.run_estimator(all_params_config, username, config_file)
         elif option == "pause":
             self.pause_threads(username)
+        elif option == "resume":
+            self.resume_threads(username)
         else:
             raise ValueError("Invalid option")
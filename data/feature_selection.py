@@ -1,22 +1,35 @@
+import functools
 import itertools
 import tensorflow as tf
-import pandas as pd
 
 from collections import defaultdict
 
+from .profiler import profile_frame
+from .utils.tabular import load_column_stats
+
+
+def standardize(x, mean, stdv):
+    return (x - mean) / stdv
+
 
 class FeatureSelection:
-    def __init__(self, df, max_categorical_size, max_range_size, min_range_size):
+    def __init__(
+        self, df, max_categorical_size, max_range_size, min_range_size, profile=None
+    ):
         self.MAX_CATEGORICAL_SIZE = max_categorical_size
         self.MAX_RANGE_SIZE = max_range_size
         self.MIN_RANGE_SIZE = min_range_size
         self.features = {}
         self.df = df
+        # single pass column statistics, only valid for the columns as loaded
+        self._profile = profile or profile_frame(
+            df, max(max_categorical_size, max_range_size)
+        )
         self.numerical_columns = self.select_columns_with_type("floating")
 
         self.int_columns = self.select_columns_with_type("integer")
         self.unique_value_size_dict = {
-            key: self.df[key].unique().shape[0] for key in self.int_columns
+            key: self._unique_count(key) for key in self.int_columns
         }
 
         self.bool_columns = self.select_columns_with_type("bool")
@@ -44,14 +57,30 @@ class FeatureSelection:
             "hash": self.hash_columns,
         }
         self.populate_defaults()
+        self._profile = None
+
+    def _unique_count(self, col):
+        if getattr(self, "_profile", None) is not None:
+            return self._profile[col].distinct_count()
+        return self.df[col].unique().shape[0]
+
+    def _unique_values(self, col):
+        if getattr(self, "_profile", None) is not None:
+            unique = self._profile[col].unique_values()
+            if unique is not None:
+                return unique
+        return self.df[col].unique().tolist()
 
     def populate_defaults(self):
-        self.medians = self.df.median().to_dict()
-        self.modes = self.df.mode().iloc[0, :].to_dict()
+        self.medians = {
+            col: self._profile[col].median() for col in self.numerical_columns
+        }
+        self.modes = {}
         self.frequent_values2frequency = {}
         for col in self.df.columns:
-            val2freq = self.df[col].value_counts().head(1).to_dict()
-            self.frequent_values2frequency.update({col: (next(iter(val2freq.items())))})
+            value, frequency = self._profile[col].most_frequent()
+            self.modes[col] = value
+            self.frequent_values2frequency[col] = (value, frequency)
 
         self.defaults = self.modes
         for col in self.numerical_columns:
@@ -73,18 +102,18 @@ class FeatureSelection:
         self.hash_columns = []
 
         for col in self.cat_or_hash_columns:
-            unique = self.df[col].unique().tolist()
-            if len(unique) < self.MAX_CATEGORICAL_SIZE:
-                self.cat_unique_values_dict[col] = unique
+            unique_count = self._unique_count(col)
+            if unique_count < self.MAX_CATEGORICAL_SIZE:
+                self.cat_unique_values_dict[col] = self._unique_values(col)
                 self.categorical_columns.append(col)
             else:
                 self.hash_columns.append(col)
-            self.unique_value_size_dict[col] = len(unique)
+            self.unique_value_size_dict[col] = unique_count
 
         for col in self.int_columns[:]:
             unique = self.unique_value_size_dict[col]
             if unique < self.MIN_RANGE_SIZE:
-                self.cat_unique_values_dict[col] = self.df[col].unique().tolist()
+                self.cat_unique_values_dict[col] = self._unique_values(col)
                 self.categorical_columns.append(col)
                 self.int_columns.remove(col)
 
@@ -109,17 +138,17 @@ class FeatureSelection:
         if without_label:
             self.remove_label(feature_types, targets)
 
-        df = pd.read_csv(training_path)
+        stats = load_column_stats(training_path) if normalize else {}
         numerical_features = []
 
         for key in feature_types["numerical"]:
-            if normalize and df[key].nunique() > 1:
-                mean = df[key].mean()
-                stdv = df[key].std()
-            numerical_features.append(
-                tf.feature_column.numeric_column(
-                    key, normalizer_fn=lambda x: (x - mean) / stdv
+            normalizer_fn = None
+            if key in stats and stats[key]["std"] > 0:
+                normalizer_fn = functools.partial(
+                    standardize, mean=stats[key]["mean"], stdv=stats[key]["std"]
                 )
+            numerical_features.append(
+                tf.feature_column.numeric_column(key, normalizer_fn=normalizer_fn)
             )
 
         range_features = [
@@ -177,17 +206,38 @@ class FeatureSelection:
     def stringify(self, list_param):
         return [str(k) for k in list_param]
 
+    def get_source_dtypes(self):
+        """Column dtypes as read from the csv, before ``update`` converted them."""
+        source = getattr(self, "source_dtypes", {})
+        return {c: source.get(c, dtype) for c, dtype in self.df.dtypes.items()}
+
+    def convert(self, df):
+        """Applies the conversions of ``update`` to rows read with the source dtypes."""
+        for c, kind in getattr(self, "conversions", {}).items():
+            if c in df.columns:
+                df[c] = df[c].astype("object")
+                if kind == "str":
+                    df[c] = df[c].values.astype("str")
+        return df
+
     def update(self, categories, defaults):
+        if getattr(self, "conversions", None) is None:
+            self.conversions = {}
+            self.source_dtypes = {}
         for i, c in enumerate(self.df.columns):
             if categories[i] == "categorical" or categories[i] == "hash":
+                self.source_dtypes.setdefault(c, self.df[c].dtype)
                 self.df[c] = self.df[c].astype("object")
                 if categories[i] == "categorical":
                     self.df[c] = self.df[c].values.astype("str")
+                    self.conversions[c] = "str"
+                else:
+                    self.conversions.setdefault(c, "object")
         self.numerical_columns = self.select_columns_with_type("floating")
 
         self.int_columns = self.select_columns_with_type("integer")
         self.unique_value_size_dict = {
-            key: self.df[key].unique().shape[0] for key in self.int_columns
+            key: self._unique_count(key) for key in self.int_columns
         }
 
         self.bool_columns = self.select_columns_with_type("bool")
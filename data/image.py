@@ -1,4 +1,12 @@
 from data.utils.image import *
+from data.image_stats import (
+    IMAGE_STATS_FILE,
+    array_mean_std,
+    image_shape,
+    ingest_image_stats,
+    read_image_stats,
+    stats_mean_std,
+)
 from oldutils import args
 from sklearn.model_selection import train_test_split
 from PIL import Image as IMAGE
@@ -44,6 +52,8 @@ class Image:
         self._augmentation_options = None
         self._augmentation_params = None
         self._n_channels = None
+        self._cache_images = True
+        self._mean_std = None
 
     def get_test_path(self):
         return self._test_path
@@ -60,6 +70,13 @@ class Image:
     def get_augmentation_params(self):
         return self._augmentation_params
 
+    def set_cache_images(self, cache):
+        self._cache_images = cache
+
+    def get_cache_images(self):
+        # datasets saved before the option existed use the cache
+        return getattr(self, "_cache_images", True)
+
     def get_class_names(self):
         return self._class_names
 
@@ -130,51 +147,85 @@ class Image:
 
         percent = percent.split(",")
         percent = (int(percent[0]), int(percent[1]), int(percent[2]))
-        # TODO split filename list or numpy array
 
-        # stratify = None
+        # the split is done on row indices so mode 3 arrays are only read
+        # once, when the split rows are written to their own files
         val_frac = percent[1] / 100
-
-        (
-            self._train_images,
-            self._val_images,
-            self._train_labels,
-            self._val_labels,
-        ) = train_test_split(
-            self._images,
-            self._labels,
-            test_size=val_frac,
-            stratify=self._labels,
-            random_state=42,
+        indices = np.arange(len(self._labels))
+        train_index, val_index = train_test_split(
+            indices, test_size=val_frac, stratify=self._labels, random_state=42
         )
-
+        test_index = None
         if percent[2] != 0:
             test_size = int(round((percent[2] / 100) * len(self._images)))
-            (
-                self._train_images,
-                self._test_images,
-                self._train_labels,
-                self._test_labels,
-            ) = train_test_split(
-                self._train_images,
-                self._train_labels,
+            train_index, test_index = train_test_split(
+                train_index,
                 test_size=test_size,
-                stratify=self._train_labels,
+                stratify=self._take(self._labels, train_index),
                 random_state=42,
             )
+
+        self._train_images, self._train_labels = self._take_split("train", train_index)
+        self._val_images, self._val_labels = self._take_split("val", val_index)
+        self._test_images = self._test_labels = None
+        if test_index is not None:
+            self._test_images, self._test_labels = self._take_split("test", test_index)
         self._train_size = len(self._train_images)
-        _, _, self._n_channels = self.get_sample().shape
+        self._resized_cache_files = None
+        _, _, self._n_channels = self.get_sample_shape()
 
-    def get_sample(self):
-        from scipy.misc import imread
+    def _take(self, values, index):
+        if isinstance(values, np.ndarray):
+            return values[index]
+        return [values[i] for i in index]
 
+    def _take_split(self, split, index):
+        if self.get_mode() == 3:
+            os.makedirs(self._cache_dir(), exist_ok=True)
+            path = rows_cache_path(
+                self._cache_dir(), split, self.get_dataset_path(), index
+            )
+            images = write_rows(self._images, index, path)
+        else:
+            images = self._take(self._images, index)
+        return images, self._take(self._labels, index)
+
+    def get_sample(self):
         if self.get_mode() == 3:
             return self._images[0]
-        img = imread(self._images[0])
+        img = np.array(IMAGE.open(self._images[0]))
         if len(img.shape) == 2:
             img = img[..., np.newaxis]
         return img
 
+    def get_sample_shape(self):
+        """(height, width, channels) of the first image, without decoding it."""
+        if self.get_mode() == 3:
+            return self._images.shape[1:]
+        columns = ["path", "height", "width", "channels"]
+        stats = read_image_stats(self._image_stats_file(), columns=columns)
+        if stats is not None and len(stats) and stats.loc[0, "path"] == self._images[0]:
+            return tuple(stats.loc[0, columns[1:]].astype(int))
+        return image_shape(self._images[0])
+
+    def _image_stats_file(self):
+        return os.path.join(os.path.dirname(self.get_dataset_path()), IMAGE_STATS_FILE)
+
+    def get_image_stats(self):
+        """Per image dims, channel mean/std and thumbnails (not for mode 3).
+
+        Computed in one parallel pass the first time and kept next to the
+        dataset, see ``data.image_stats``.
+        """
+        if self.get_mode() == 3:
+            return None
+        stats_file = self._image_stats_file()
+        images = list(self._images)
+        stats = read_image_stats(stats_file)
+        if stats is None or stats["path"].tolist() != images:
+            stats = ingest_image_stats(images, list(self._labels), stats_file)
+        return stats
+
     def get_num_outputs(self):
         num_classes = len(self.get_class_names())
         if num_classes > 2:
@@ -214,8 +265,59 @@ class Image:
             return tf.image.resize_images(image_decoded, size), label
         return tf.image.resize_images(image_decoded, size)
 
+    def _cast_function(self, image, label=None):
+        image = tf.cast(image, tf.float32)
+        if label is not None:
+            return image, label
+        return image
+
+    def _cache_dir(self):
+        return os.path.join(os.path.dirname(self.get_dataset_path()), IMAGE_CACHE_DIR)
+
+    def _resized_cache_file(self, split, images):
+        # keyed once per split and image size instead of on every input_fn
+        files = getattr(self, "_resized_cache_files", None)
+        if files is None:
+            files = self._resized_cache_files = {}
+        key = (split, tuple(self.get_image_size()))
+        if key not in files:
+            files[key] = resized_cache_file(
+                list(images),
+                self.get_image_size(),
+                self._cache_dir(),
+                cache_slot(split, self.get_dataset_path()),
+            )
+        return files[key]
+
+    def _decoded_dataset(self, split, images, labels=None, shuffle=False, num_epochs=1):
+        """Resized float images of a split, with labels if given.
+
+        With the image cache enabled the files are decoded and resized once
+        into a uint8 memmap that later epochs and runs read from.
+        """
+        autotune = tf.data.experimental.AUTOTUNE
+        if self.get_mode() != 3 and self.get_cache_images():
+            array = cache_resized_images(
+                list(images),
+                self.get_image_size(),
+                self._resized_cache_file(split, images),
+            )
+            dataset = dataset_from_memmap(array, labels, shuffle, num_epochs)
+            return dataset.map(self._cast_function, num_parallel_calls=autotune)
+
+        if self.get_mode() == 3:
+            dataset = dataset_from_memmap(images, labels, shuffle, num_epochs)
+            return dataset.map(self._parse_function, num_parallel_calls=autotune)
+
+        dataset = dataset_from_files(images, labels)
+        if shuffle:
+            dataset = dataset.shuffle(len(images))
+        return dataset.repeat(num_epochs).map(
+            self._parse_function, num_parallel_calls=autotune
+        )
+
     def _norm_function(self, image, label=None):
-        image = norm_tf_options[self.get_normalization_method()](image)
+        image = self._normalize(image, norm_tf_options)
         if label is not None:
             return image, label
         return image
@@ -267,53 +369,49 @@ class Image:
         return image, label
 
     def train_input_fn(self, batch_size, num_epochs):
-        if self.get_mode() == 3:
-            dataset = dataset_from_array(self._train_images, self._train_labels)
-        else:
-            dataset = dataset_from_files(self._train_images, self._train_labels)
-
+        autotune = tf.data.experimental.AUTOTUNE
         dataset = (
-            dataset.shuffle(len(self._train_images))
-                .repeat(num_epochs)
-                .map(self._parse_function)
-                .map(self._parse_augmentation_options)
-                .map(self._norm_function)
-                .batch(batch_size)
+            self._decoded_dataset(
+                "train",
+                self._train_images,
+                self._train_labels,
+                shuffle=True,
+                num_epochs=num_epochs,
+            )
+            .map(self._parse_augmentation_options, num_parallel_calls=autotune)
+            .map(self._norm_function, num_parallel_calls=autotune)
+            .batch(batch_size)
         )
-
-        dataset = dataset.prefetch(1)
-        return dataset
+        return dataset.prefetch(autotune)
 
     def validation_input_fn(self, batch_size):
-        if self.get_mode() == 3:
-            dataset = dataset_from_array(self._val_images, self._val_labels)
-        else:
-            dataset = dataset_from_files(self._val_images, self._val_labels)
+        autotune = tf.data.experimental.AUTOTUNE
         dataset = (
-            dataset.map(self._parse_function).map(self._norm_function).batch(batch_size)
+            self._decoded_dataset("val", self._val_images, self._val_labels)
+            .map(self._norm_function, num_parallel_calls=autotune)
+            .batch(batch_size)
         )
-        dataset = dataset.prefetch(1)
-        return dataset
+        return dataset.prefetch(autotune)
 
     def test_input_fn(self, batch_size, file=None):
-        if self.get_mode() == 3:
-            if file is not None:
-                dataset = dataset_from_array(file)
+        autotune = tf.data.experimental.AUTOTUNE
+        if file is not None:
+            # arbitrary test files are not worth caching
+            if self.get_mode() == 3:
+                dataset = dataset_from_memmap(file)
             else:
-                dataset = dataset_from_array(self._test_images, self._test_labels)
-
-        else:
-            if file is not None:
                 dataset = dataset_from_files(file)
-            else:
-                dataset = dataset_from_files(self._test_images, self._test_labels)
-        dataset = (
-            dataset.map(self._parse_function).map(self._norm_function).batch(batch_size)
+            dataset = dataset.map(self._parse_function, num_parallel_calls=autotune)
+        else:
+            dataset = self._decoded_dataset(
+                "test", self._test_images, self._test_labels
+            )
+        dataset = dataset.map(self._norm_function, num_parallel_calls=autotune).batch(
+            batch_size
         )
-        dataset = dataset.prefetch(1)
-        return dataset
+        return dataset.prefetch(autotune)
 
-    def input_predict_fn(self, image):
+    def predict_features(self, image):
         if len(image.shape) == 2:
             image = imresize(
                 image, self.get_image_size()[0:2], interp="bilinear"
@@ -324,12 +422,17 @@ class Image:
         if len(image.shape) == 3:
             image = image[np.newaxis, ...]
         # TODO normalization
-        image = norm_options[self.get_normalization_method()](image)
+        return self._normalize(image, norm_options)
 
+    def input_predict_fn(self, image):
         return tf.estimator.inputs.numpy_input_fn(
-            x=image, y=None, num_epochs=1, shuffle=False
+            x=self.predict_features(image), y=None, num_epochs=1, shuffle=False
         )
 
+    def test_features(self, file):
+        images = file if self.get_mode() == 3 else (np.array(IMAGE.open(f)) for f in file)
+        return np.concatenate([self.predict_features(image) for image in images])
+
     def serving_input_receiver_fn(self):
         receiver_tensors = tf.placeholder(
             tf.float32, [None, None, None, self._n_channels]
@@ -339,7 +442,33 @@ class Image:
         )
 
     def normalize(self, image):
-        return norm_options[self.get_normalization_method()](image)
+        return self._normalize(image, norm_options)
+
+    def _normalize(self, image, options):
+        if self.get_normalization_method() == DATASET_MEAN_STD:
+            mean, std = self.get_mean_std()
+            return standardize_channels(image, mean, std)
+        return options[self.get_normalization_method()](image)
+
+    def get_mean_std(self):
+        """Per channel pixel mean/std of the whole dataset, computed once."""
+        if getattr(self, "_mean_std", None) is None:
+            if self.get_mode() == 3:
+                mean, std = array_mean_std(self._images)
+            elif self.get_mode() == 1:
+                mean, std = folder_mean_std(
+                    self.get_dataset_path(), self.get_sample_shape()[-1]
+                )
+            else:
+                mean, std = stats_mean_std(
+                    self.get_image_stats(), self.get_sample_shape()[-1]
+                )
+            # constant channels would divide by zero
+            self._mean_std = (
+                mean.astype(np.float32),
+                np.maximum(std, 1e-6).astype(np.float32),
+            )
+        return self._mean_std
 
     def get_all_test_files(self):
         test_path = self.get_dataset_path().replace("train_orgin", "test")
@@ -0,0 +1,296 @@
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from PIL import Image as IMAGE
+
+IMAGE_STATS_FILE = ".image_stats.parquet"
+
+THUMBNAIL_SIZE = 64
+
+STATS_WORKERS = 8
+
+MEAN_STD_CHUNK_ROWS = 256
+
+DATASET_MEAN_STD = "dataset_mean_std"
+
+_CHANNEL_MODES = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}
+
+
+class ChannelStats:
+    """Per channel mean and variance accumulated in a streaming pass.
+
+    Batches are reduced to (count, mean, M2) and merged with Welford's
+    parallel update, so partial results from several workers combine
+    exactly.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    def merge(self, count, mean, m2):
+        if count == 0:
+            return
+        if self.mean is None:
+            self.count, self.mean, self.m2 = count, np.array(mean), np.array(m2)
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def update(self, pixels):
+        pixels = pixels.reshape(-1, pixels.shape[-1]).astype(np.float64)
+        mean = pixels.mean(axis=0)
+        self.merge(len(pixels), mean, ((pixels - mean) ** 2).sum(axis=0))
+
+    def std(self):
+        if self.count == 0:
+            raise ValueError("No pixels to compute the channel mean/std from")
+        return np.sqrt(self.m2 / self.count)
+
+
+def _image_stats(path, label):
+    with IMAGE.open(path) as im:
+        height, width = im.height, im.width
+        pixels = np.asarray(im, dtype=np.float64)
+        if pixels.ndim == 2:
+            pixels = pixels[..., np.newaxis]
+        thumbnail = im.convert("RGB" if pixels.shape[-1] > 1 else "L")
+        thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        buff = io.BytesIO()
+        thumbnail.save(buff, format="JPEG")
+
+    pixels = pixels.reshape(-1, pixels.shape[-1])
+    return {
+        "path": path,
+        "class": label,
+        "mtime": os.path.getmtime(path),
+        "height": height,
+        "width": width,
+        "channels": pixels.shape[1],
+        "mean": pixels.mean(axis=0).tolist(),
+        "std": pixels.std(axis=0).tolist(),
+        "thumbnail": buff.getvalue(),
+    }
+
+
+def image_shape(path):
+    """(height, width, channels) read from the image header only."""
+    with IMAGE.open(path) as im:
+        return im.height, im.width, len(im.getbands())
+
+
+def read_image_stats(stats_file, columns=None):
+    if not os.path.isfile(stats_file):
+        return None
+    return pq.read_table(stats_file, columns=columns, memory_map=True).to_pandas()
+
+
+def ingest_image_stats(filenames, labels, stats_file, workers=STATS_WORKERS):
+    """Per image dims, channel mean/std and a thumbnail, in one parallel pass.
+
+    The rows are kept in a Parquet file; rows of files that did not change
+    since the last ingestion are reused, so only new images are decoded.
+    Returns the stats as a DataFrame in ``filenames`` order.
+    """
+    previous = {}
+    old = read_image_stats(stats_file)
+    if old is not None:
+        previous = {row["path"]: row for row in old.to_dict("records")}
+
+    def stats(i):
+        path = filenames[i]
+        row = previous.get(path)
+        if row is not None and row["mtime"] == os.path.getmtime(path):
+            row["class"] = labels[i]
+            return row
+        return _image_stats(path, labels[i])
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        rows = list(executor.map(stats, range(len(filenames))))
+
+    df = pd.DataFrame(rows)
+    df["class"] = df["class"].astype(str)
+    tmp_file = stats_file + ".tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_file)
+    os.replace(tmp_file, stats_file)
+    return df
+
+
+def summarize_image_stats(df):
+    """Dashboard summary: class counts, image dims and channel statistics.
+
+    Channel statistics are averaged over the images with the most common
+    number of channels.
+    """
+    main = df[df["channels"] == df["channels"].mode()[0]]
+    return {
+        "counts": df["class"].value_counts().to_dict(),
+        "height": df["height"].describe().to_dict(),
+        "width": df["width"].describe().to_dict(),
+        "channel_mean": np.mean(main["mean"].tolist(), axis=0).tolist(),
+        "channel_std": np.mean(main["std"].tolist(), axis=0).tolist(),
+    }
+
+
+def _file_moments(path, n_channels):
+    with IMAGE.open(path) as im:
+        pixels = np.asarray(im.convert(_CHANNEL_MODES[n_channels]), dtype=np.float64)
+    pixels = pixels.reshape(-1, n_channels)
+    mean = pixels.mean(axis=0)
+    return len(pixels), mean, ((pixels - mean) ** 2).sum(axis=0)
+
+
+def files_mean_std(filenames, n_channels, workers=STATS_WORKERS):
+    """Per channel mean/std over the pixels of all ``filenames`` (0-255)."""
+    stats = ChannelStats()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for moments in executor.map(
+            lambda f: _file_moments(f, n_channels), filenames
+        ):
+            stats.merge(*moments)
+    return stats.mean, stats.std()
+
+
+def stats_mean_std(df, n_channels):
+    """Per channel mean/std pooled from ingested per image statistics.
+
+    Images with another number of channels are left out; ``ValueError`` is
+    raised if none is left.
+    """
+    stats = ChannelStats()
+    for row in df[df["channels"] == n_channels].itertuples():
+        count = row.height * row.width
+        std = np.asarray(row.std)
+        stats.merge(count, np.asarray(row.mean), std ** 2 * count)
+    return stats.mean, stats.std()
+
+
+def array_mean_std(array, chunk_rows=MEAN_STD_CHUNK_ROWS):
+    """Per channel mean/std of an image array, read chunk by chunk."""
+    stats = ChannelStats()
+    for start in range(0, len(array), chunk_rows):
+        chunk = np.asarray(array[start: start + chunk_rows])
+        if chunk.ndim == 3:
+            chunk = chunk[..., np.newaxis]
+        stats.update(chunk)
+    return stats.mean, stats.std()
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+MANIFEST_FILE = ".manifest.json"
+
+MANIFEST_WORKERS = 8
+
+
+def _image_dims(path):
+    try:
+        with IMAGE.open(path) as im:
+            return im.height, im.width
+    except OSError:
+        return None, None
+
+
+def _scan_class(class_dir, class_name, previous):
+    """Manifest entries of one class folder, reusing unchanged ``previous`` ones."""
+    entries = {}
+    with os.scandir(class_dir) as it:
+        for entry in it:
+            if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            stat = entry.stat()
+            old = previous.get(entry.path)
+            if old and old["size"] == stat.st_size and old["mtime"] == stat.st_mtime:
+                entries[entry.path] = old
+                continue
+            height, width = _image_dims(entry.path)
+            entries[entry.path] = {
+                "class": class_name,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "height": height,
+                "width": width,
+            }
+    return entries
+
+
+def _class_dirs(data_dir):
+    with os.scandir(data_dir) as it:
+        return sorted(
+            (e.name, e.path, e.stat().st_mtime)
+            for e in it
+            if e.is_dir() and not e.name.startswith(".")
+        )
+
+
+def read_manifest(data_dir):
+    path = os.path.join(data_dir, MANIFEST_FILE)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return None
+
+
+def build_manifest(data_dir, workers=MANIFEST_WORKERS):
+    """Indexes the images of a folder per class dataset.
+
+    Returns ``{"dirs": {class: mtime}, "files": {path: entry}}`` where an
+    entry has the class, size, mtime and image dims. The manifest is kept
+    in ``data_dir``. Every call stats the files, since overwriting an image
+    in place leaves its folder's mtime unchanged; the stored manifest is
+    returned as is when no file changed, and otherwise only new or modified
+    files are opened again.
+    """
+    class_dirs = _class_dirs(data_dir)
+    dirs = {name: mtime for name, _, mtime in class_dirs}
+    manifest = read_manifest(data_dir)
+
+    previous = manifest["files"] if manifest is not None else {}
+    files = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for entries in executor.map(
+            lambda d: _scan_class(d[1], d[0], previous), class_dirs
+        ):
+            files.update(entries)
+
+    if manifest is not None and manifest["dirs"] == dirs and manifest["files"] == files:
+        return manifest
+    manifest = {"dirs": dirs, "files": files}
+    _write_manifest(data_dir, manifest)
+    return manifest
+
+
+def _write_manifest(data_dir, manifest):
+    tmp_file = os.path.join(data_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, os.path.join(data_dir, MANIFEST_FILE))
+
+
+def folder_mean_std(data_dir, n_channels=3):
+    """Per channel pixel mean/std (0-255) of a folder per class dataset.
+
+    Computed once in a parallel streaming pass and stored in the manifest,
+    which drops it again as soon as the images change.
+    """
+    manifest = build_manifest(data_dir)
+    key = f"mean_std_{n_channels}"
+    if key not in manifest:
+        mean, std = files_mean_std(sorted(manifest["files"]), n_channels)
+        manifest[key] = [mean.tolist(), std.tolist()]
+        _write_manifest(data_dir, manifest)
+    mean, std = manifest[key]
+    return np.array(mean), np.array(std)
@@ -0,0 +1,209 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+PROFILE_CHUNK_SIZE = 100000
+
+HLL_PRECISION = 12
+
+QUANTILE_SKETCH_SIZE = 2048
+
+
+class HyperLogLog:
+    """Approximate distinct counter over 64-bit value hashes."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self._p = precision
+        self._m = 1 << precision
+        self._registers = np.zeros(self._m, dtype=np.uint8)
+
+    def update(self, hashes):
+        index = (hashes >> np.uint64(64 - self._p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self._p)) - 1)
+        # bit length of the remaining bits, exact in float64 for precision >= 11
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = (64 - self._p) - bit_length + 1
+        np.maximum.at(self._registers, index, rank.astype(np.uint8))
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self._m)
+        estimate = alpha * self._m ** 2 / np.sum(2.0 ** -self._registers.astype(float))
+        zeros = np.count_nonzero(self._registers == 0)
+        if estimate <= 2.5 * self._m and zeros:
+            estimate = self._m * math.log(self._m / zeros)
+        return int(round(estimate))
+
+
+class QuantileSketch:
+    """Mergeable compacting quantile sketch (KLL style) with bounded size.
+
+    Values stay exact until more than ``k`` have been seen; after that each
+    level halves its buffer into the next one with doubled weight.
+    """
+
+    def __init__(self, k=QUANTILE_SKETCH_SIZE):
+        self._k = k
+        self._levels = [np.empty(0)]
+
+    def update(self, values):
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if len(items) > self._k:
+                items = np.sort(items)
+                if len(items) % 2:
+                    self._levels[level], items = items[-1:], items[:-1]
+                else:
+                    self._levels[level] = np.empty(0)
+                promoted = items[np.random.randint(2):: 2]
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                self._levels[level + 1] = np.concatenate(
+                    [self._levels[level + 1], promoted]
+                )
+            level += 1
+
+    def is_exact(self):
+        return len(self._levels) == 1
+
+    def quantile(self, q):
+        if self.is_exact():
+            return float(np.quantile(self._levels[0], q)) if len(self._levels[0]) else np.nan
+        values = np.concatenate(self._levels)
+        weights = np.concatenate(
+            [np.full(len(items), 2 ** i) for i, items in enumerate(self._levels)]
+        )
+        order = np.argsort(values)
+        cumulative = np.cumsum(weights[order])
+        return float(values[order][np.searchsorted(cumulative, q * cumulative[-1])])
+
+
+class FrequentValues:
+    """Value counts, exact up to ``capacity`` distinct values.
+
+    Past the capacity it degrades to a Misra-Gries heavy hitter summary, so
+    the most frequent values are kept with (under-)estimated counts.
+    """
+
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self.counts = {}
+        self.exact = True
+
+    def update(self, values, counts):
+        if len(values) > self._capacity:
+            # only the chunk's own heavy hitters can survive the merge
+            self.exact = False
+            top = np.argpartition(counts, -self._capacity)[-self._capacity:]
+            values = [values[i] for i in sorted(top)]
+            counts = counts[np.sort(top)]
+        for value, count in zip(values, counts):
+            self.counts[value] = self.counts.get(value, 0) + int(count)
+        if len(self.counts) > self._capacity:
+            self.exact = False
+            threshold = sorted(self.counts.values(), reverse=True)[self._capacity]
+            self.counts = {
+                v: c - threshold for v, c in self.counts.items() if c > threshold
+            }
+
+    def most_frequent(self):
+        if not self.counts:
+            return np.nan, 0
+        top = max(self.counts.values())
+        candidates = [v for v, c in self.counts.items() if c == top]
+        try:
+            # same tie break as DataFrame.mode
+            return sorted(candidates)[0], top
+        except TypeError:
+            return candidates[0], top
+
+
+class ColumnProfile:
+    def __init__(self, capacity, quantile_k):
+        self.count = 0
+        self.null_count = 0
+        self.min = None
+        self.max = None
+        self._hll = HyperLogLog()
+        self._frequent = FrequentValues(capacity)
+        self._quantiles = None
+        self._quantile_k = quantile_k
+
+    def update(self, series):
+        values = series.values
+        self.count += len(values)
+        nulls = pd.isnull(values)
+        self.null_count += int(nulls.sum())
+
+        uniques, codes = pd.factorize(values, sort=False)
+        if len(uniques):
+            self._frequent.update(
+                uniques.tolist(), np.bincount(codes[codes >= 0], minlength=len(uniques))
+            )
+            self._hll.update(pd.util.hash_array(np.asarray(uniques)))
+
+        if series.dtype.kind in "iuf":
+            non_null = values[~nulls].astype(np.float64)
+            if len(non_null):
+                if self._quantiles is None:
+                    self._quantiles = QuantileSketch(self._quantile_k)
+                self._quantiles.update(non_null)
+                low, high = non_null.min(), non_null.max()
+                self.min = low if self.min is None else min(self.min, low)
+                self.max = high if self.max is None else max(self.max, high)
+
+    def distinct_count(self):
+        """Distinct values, counting missing values once like ``unique()``."""
+        has_nan = 1 if self.null_count else 0
+        if self._frequent.exact:
+            return len(self._frequent.counts) + has_nan
+        return max(self._hll.count(), len(self._frequent.counts) + 1) + has_nan
+
+    def unique_values(self):
+        """Distinct values in order of appearance, None past the capacity."""
+        if not self._frequent.exact:
+            return None
+        values = list(self._frequent.counts)
+        if self.null_count:
+            values.append(np.nan)
+        return values
+
+    def median(self):
+        return np.nan if self._quantiles is None else self._quantiles.quantile(0.5)
+
+    def most_frequent(self):
+        return self._frequent.most_frequent()
+
+
+class DatasetProfile:
+    """Single pass column statistics over a stream of DataFrame chunks.
+
+    Memory is bounded by ``capacity`` tracked values per column plus fixed
+    size distinct-count and quantile sketches, independent of the row count.
+    """
+
+    def __init__(self, capacity, quantile_k=QUANTILE_SKETCH_SIZE):
+        self._capacity = capacity
+        self._quantile_k = quantile_k
+        self.columns = {}
+        self.num_rows = 0
+
+    def update(self, chunk):
+        self.num_rows += len(chunk)
+        for col in chunk.columns:
+            if col not in self.columns:
+                self.columns[col] = ColumnProfile(self._capacity, self._quantile_k)
+            self.columns[col].update(chunk[col])
+
+    def __getitem__(self, col):
+        return self.columns[col]
+
+
+def profile_frame(df, capacity, chunk_size=PROFILE_CHUNK_SIZE):
+    profile = DatasetProfile(capacity)
+    for start in range(0, len(df), chunk_size):
+        profile.update(df.iloc[start: start + chunk_size])
+    return profile
+
@@ -0,0 +1,197 @@
+import json
+import mmap
+import os
+
+import dill as pickle
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .tabular import Tabular
+from .utils.image import IMAGE_CACHE_DIR
+
+DATASET_EXTENSION = ".dataset"
+FORMAT_VERSION = 1
+
+HEADER_FILE = "header.json"
+STATE_FILE = "state.pkl"
+DATA_FILE = "data.parquet"
+
+# numpy attributes of Image datasets (mode 3) stored as memory-mapped columns
+IMAGE_ARRAYS = [
+    "_images",
+    "_labels",
+    "_train_images",
+    "_val_images",
+    "_test_images",
+    "_train_labels",
+    "_val_labels",
+    "_test_labels",
+]
+
+
+def _tabular_header(dataset, df):
+    return {
+        "type": "tabular",
+        "name": dataset.get_name(),
+        "targets": dataset.get_targets(),
+        "columns": df.columns.tolist(),
+        "dtypes": {c: str(t) for c, t in df.dtypes.items()},
+        "num_rows": len(df),
+        "defaults": dataset.get_defaults(),
+        "categories": dataset.get_column_categories(),
+        "normalize": dataset.get_normalize(),
+        "split": dataset.get_split(),
+        "train_file": dataset.get_train_file(),
+        "validation_file": dataset.get_validation_file(),
+        "test_file": dataset.get_test_file(),
+    }
+
+
+def _image_header(dataset, arrays, files):
+    return {
+        "type": "image",
+        "name": dataset.get_name(),
+        "mode": dataset.get_mode(),
+        "class_names": dataset.get_class_names(),
+        "image_size": dataset.get_image_size(),
+        "normalization": dataset.get_normalization_method(),
+        "split": dataset.get_split(),
+        "arrays": {k: [list(v.shape), str(v.dtype)] for k, v in arrays.items()},
+        "files": files,
+    }
+
+
+def _array_file(array):
+    """Path of the ``.npy`` file a whole array is memory mapped from, if any."""
+    if isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap):
+        return array.filename
+    return None
+
+
+def _write_tabular(dataset, path):
+    df = dataset.get_df()
+    fs = dataset.get_feature_selection()
+    pq.write_table(
+        pa.Table.from_pandas(df, preserve_index=False),
+        os.path.join(path, DATA_FILE),
+    )
+    # the dataframe is shared with the feature selection, only the rest is pickled
+    dataset._df = None
+    fs_df, fs.df = fs.df, None
+    try:
+        with open(os.path.join(path, STATE_FILE), "wb") as f:
+            pickle.dump(dataset, f)
+    finally:
+        dataset._df = df
+        fs.df = fs_df
+    return _tabular_header(dataset, df)
+
+
+def _link(source, target):
+    """Hard links ``source`` to ``target``, False if the filesystem refuses."""
+    try:
+        if os.path.exists(target):
+            if os.path.samefile(source, target):
+                return True
+            os.remove(target)
+        os.link(source, target)
+        return True
+    except OSError:
+        return False
+
+
+def _write_image(dataset, path):
+    arrays = {
+        k: getattr(dataset, k)
+        for k in IMAGE_ARRAYS
+        if isinstance(getattr(dataset, k), np.ndarray)
+    }
+    files = {}
+    for k, v in arrays.items():
+        # arrays already memory mapped from a file (mode 3) are hard linked
+        # instead of copied into the store, so deleting superseded split
+        # caches never breaks a saved dataset; the dataset's own source
+        # array is referenced when it cannot be linked
+        target = os.path.join(path, k.lstrip("_") + ".npy")
+        source = _array_file(v)
+        if source is None or not _link(source, target):
+            if source is not None and os.path.basename(
+                os.path.dirname(source)
+            ) != IMAGE_CACHE_DIR:
+                files[k] = source
+            else:
+                np.save(target, v)
+        setattr(dataset, k, None)
+    try:
+        with open(os.path.join(path, STATE_FILE), "wb") as f:
+            pickle.dump(dataset, f)
+    finally:
+        for k, v in arrays.items():
+            setattr(dataset, k, v)
+    return _image_header(dataset, arrays, files)
+
+
+def write_dataset(dataset, path):
+    """Writes a Tabular or Image dataset to a directory store.
+
+    Bulk data goes to a Parquet file (tabular) or ``.npy`` arrays (images)
+    next to a small JSON header; only the remaining object state is pickled.
+    """
+    os.makedirs(path, exist_ok=True)
+    if isinstance(dataset, Tabular):
+        header = _write_tabular(dataset, path)
+    else:
+        header = _write_image(dataset, path)
+    header["format"] = FORMAT_VERSION
+
+    # the header is replaced last so the directory mtime marks a complete write
+    tmp_file = os.path.join(path, HEADER_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(header, f, default=str)
+    os.replace(tmp_file, os.path.join(path, HEADER_FILE))
+
+
+def read_header(path):
+    with open(os.path.join(path, HEADER_FILE)) as f:
+        return json.load(f)
+
+
+def read_dataset_name(path):
+    """Dataset name without loading the dataset."""
+    if os.path.isdir(path):
+        return read_header(path)["name"]
+    return load_dataset(path).get_name()
+
+
+def read_dataframe(path, columns=None):
+    """Reads the tabular data with the file memory mapped."""
+    return pq.read_table(
+        os.path.join(path, DATA_FILE), columns=columns, memory_map=True
+    ).to_pandas()
+
+
+def load_dataset(path):
+    """Loads a dataset written by ``write_dataset``.
+
+    Tabular data is read on first access and image arrays are memory mapped,
+    so processes that only need the metadata never deserialise the data.
+    Legacy pickled datasets are still accepted.
+    """
+    if os.path.isfile(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    header = read_header(path)
+    with open(os.path.join(path, STATE_FILE), "rb") as f:
+        dataset = pickle.load(f)
+
+    if header["type"] == "tabular":
+        dataset.set_data_store(path)
+    else:
+        files = header.get("files", {})
+        for k in header["arrays"]:
+            file = files.get(k, os.path.join(path, k.lstrip("_") + ".npy"))
+            setattr(dataset, k, np.load(file, mmap_mode="r"))
+    return dataset
+
@@ -1,9 +1,15 @@
 from functools import reduce
 
-from sklearn.model_selection import train_test_split
 from tensorflow.python.feature_column.feature_column_v2 import IndicatorColumn
 
-from .utils.tabular import make_csv_dataset
+from .utils.tabular import (
+    make_csv_dataset,
+    make_tfrecord_dataset,
+    read_record_spec,
+    record_spec,
+    stream_split,
+    write_record_spec,
+)
 from .feature_selection import FeatureSelection
 from oldutils import args
 
@@ -30,6 +36,7 @@ class Tabular:
         self._test_file = None
 
         self._df = None
+        self._data_store = None
 
         self._normalize = False
 
@@ -45,9 +52,11 @@ class Tabular:
         self._all_feature_columns = None  # session -> all_features
         self._feature_columns = None  # session -> features
         self._feature_names = None
+        self._encoders = None  # feature -> (categories, code map, dtype, is hash)
 
         self._train_size = None
         self._split = None
+        self._record_files = None  # split -> tfrecord shards
 
         self.set_file(file)
         self.set_name(name)
@@ -111,8 +120,18 @@ class Tabular:
         return self._test_file
 
     def get_df(self):
+        if self._df is None and getattr(self, "_data_store", None) is not None:
+            from .store import read_dataframe
+
+            self._df = read_dataframe(self._data_store)
+            if self._fs is not None and self._fs.df is None:
+                self._fs.df = self._df
         return self._df
 
+    def set_data_store(self, path):
+        args.assert_folder(path)
+        self._data_store = path
+
     def set_df(self, df):
         args.assert_type(pd.DataFrame, df)
         self._df = df
@@ -125,6 +144,8 @@ class Tabular:
         self._normalize = norm
 
     def get_feature_selection(self):
+        if self._fs is not None and self._fs.df is None:
+            self.get_df()
         return self._fs
 
     def set_feature_selection(self, fs):
@@ -183,6 +204,7 @@ class Tabular:
         args.assert_type(list, fc)
         self._feature_columns = fc
         self._feature_names = get_feature_names(self.get_feature_columns())
+        self._encoders = None
 
     def get_all_feature_columns(self):
         return self._all_feature_columns
@@ -202,6 +224,19 @@ class Tabular:
             return self._train_size
         return None
 
+    def get_record_files(self, split):
+        record_files = getattr(self, "_record_files", None) or {}
+        files = record_files.get(split)
+        if not files or not all(os.path.isfile(f) for f in files):
+            return None
+        # column types changed since the split, parse the csv instead
+        defaults = self.get_keyed_defaults()
+        if defaults is None or read_record_spec(
+            os.path.dirname(files[0])
+        ) != record_spec(defaults):
+            return None
+        return files
+
     def get_split(self):
         return self._split
 
@@ -230,8 +265,9 @@ class Tabular:
     ):
         df = self.get_df()
         categories = self.get_categories()
-        df = df.apply(lambda x: x.fillna(x.mode()), axis=0)
-        data = df.head(sample_data_size).T
+        # fill the sample rows with the profiled modes instead of a full df.mode()
+        data = df.head(sample_data_size)
+        data = data.fillna(value=self.get_feature_selection().modes).T
         data.insert(0, "Defaults", default_list.values())
         data.insert(0, "(most frequent, frequency)", frequent_values2frequency.values())
         data.insert(0, "Unique Values", unique_values)
@@ -375,43 +411,41 @@ class Tabular:
 
         train_file = os.path.join(file.rstrip(basename), "train_orgin", basename)
         validation_file = os.path.join(file.rstrip(basename), "valid", basename)
+        outputs = {"train": train_file, "valid": validation_file}
 
         percent = percent.split(",")
         percent = (int(percent[0]), int(percent[1]), int(percent[2]))
-        targets = self.get_targets()
-
-        df = self.get_df()
-        stratify = None
-        val_frac = percent[1] / 100
-
-        if len(targets) == 1 and self.get_df()[targets[0]].dtype == "object":
-            counts = df[targets[0]].value_counts()
-            df = df[df[targets[0]].isin(counts[counts > 1].index)]
-            stratify = df[[targets[0]]]
-
-        train_df, val_df = train_test_split(
-            df, test_size=val_frac, stratify=stratify, random_state=42
-        )
+        fractions = {"train": percent[0], "valid": percent[1]}
 
         if percent[2] != 0:
             pre = os.path.join(file.rstrip(basename), "test", basename).split(".")
-            test_file = f"{pre[0]}_split_test.{pre[1]}"
-            test_size = int(round((percent[2] / 100) * len(df)))
-            if len(targets) == 1 and self.get_df()[targets[0]].dtype == "object":
-                counts = train_df[targets[0]].value_counts()
-                train_df = train_df[train_df[targets[0]].isin(counts[counts > 1].index)]
-                stratify = train_df[[targets[0]]]
-            train_df, test_df = train_test_split(
-                train_df, test_size=test_size, stratify=stratify, random_state=42
-            )
-            test_df.to_csv(test_file, index=False)
-            self.set_test_file(test_file)
+            outputs["test"] = f"{pre[0]}_split_test.{pre[1]}"
+            fractions["test"] = percent[2]
 
-        train_df.to_csv(train_file, index=False)
-        val_df.to_csv(validation_file, index=False)
+        targets = self.get_targets()
+        df = self.get_df()
+        stratify = None
+        if len(targets) == 1 and df[targets[0]].dtype == "object":
+            stratify = targets[0]
+
+        records_path = os.path.join(os.path.dirname(file), "records")
+        sizes, self._record_files = stream_split(
+            file,
+            fractions,
+            outputs,
+            target=stratify,
+            dtype=self.get_feature_selection().get_source_dtypes(),
+            convert_fn=self.get_feature_selection().convert,
+            clean_fn=self.clean_values,
+            records_path=records_path,
+        )
+        write_record_spec(records_path, self.get_keyed_defaults())
 
+        if "test" in outputs:
+            self.set_test_file(outputs["test"])
         self.set_train_file(train_file)
         self.set_validation_file(validation_file)
+        self._train_size = sizes["train"]
 
     def get_params(self):
         return {
@@ -478,49 +512,83 @@ class Tabular:
         self._converted_defaults = [[key] for key in defaults.values()]
         self._keyed_defaults = defaults
 
-    def to_array(self, features):
-        df = self.get_df()[self.get_feature_names()].copy()
-        feature_types = self.get_dtypes()
-        for c in df.columns:
-            if c in features.keys():
+    def get_encoders(self):
+        """Per-feature encoders used by ``to_array`` / ``from_array``.
+
+        Object columns are encoded as the index of the value in the sorted
+        categories of the column (the same codes as ``astype("category")``),
+        every other column as a float. Built once per feature selection.
+        """
+        if getattr(self, "_encoders", None) is None:
+            df = self.get_df()
+            feature_types = self.get_dtypes()
+            encoders = {}
+            for c in self.get_feature_names():
                 if df[c].dtype == "object":
-                    if feature_types[c] == "hash":
-                        try:
-                            features[c] = int(float(features[c]))
-                        except Exception:
-                            pass
-                    df.loc[:, c] = df.loc[:, c].astype("category")
-                    mapp = {
-                        y: x for x, y in dict(enumerate(df[c].cat.categories)).items()
-                    }
-                    features[c] = float(mapp[features[c]])
+                    categories = pd.Categorical(df[c]).categories.values
+                    code_map = {v: float(i) for i, v in enumerate(categories)}
+                    is_hash = feature_types[c] == "hash"
+                    encoders[c] = (categories, code_map, df[c].dtype, is_hash)
                 else:
-                    features[c] = float(features[c])
-        feats = (
-            df[self.get_feature_names()]
-                .append(
-                pd.DataFrame(pd.Series(features)).transpose()[self.get_feature_names()]
+                    encoders[c] = (None, None, df[c].dtype, False)
+            self._encoders = encoders
+        return self._encoders
+
+    @staticmethod
+    def _encode_value(encoder, value):
+        categories, code_map, _, is_hash = encoder
+        if categories is None:
+            return float(value)
+        if is_hash:
+            try:
+                value = int(float(value))
+            except Exception:
+                pass
+        return code_map[value]
+
+    def to_array(self, features):
+        """Encodes a row (scalar values) or a batch (array values) of features.
+
+        Returns a vector for a single row and an (n_rows, n_features) array
+        for a batch, with columns in ``get_feature_names()`` order. A category
+        not seen in the dataset raises ``KeyError`` in both cases.
+        """
+        encoders = self.get_encoders()
+        names = self.get_feature_names()
+        if np.ndim(features[names[0]]) == 0:
+            return np.array(
+                [self._encode_value(encoders[c], features[c]) for c in names]
             )
-                .tail(1)
-        )
-        input_predict = feats.values.reshape(-1)
-        return input_predict
+        columns = []
+        for c in names:
+            encoder = encoders[c]
+            if encoder[0] is None:
+                columns.append(np.asarray(features[c], dtype=float))
+            elif encoder[3]:
+                columns.append(
+                    np.array([self._encode_value(encoder, v) for v in features[c]])
+                )
+            else:
+                values = np.asarray(features[c])
+                codes = pd.Categorical(values, categories=encoder[0]).codes
+                if (codes < 0).any():
+                    # unseen or missing category, as code_map[value] does for a row
+                    raise KeyError(values[np.argmax(codes < 0)])
+                columns.append(codes.astype(float))
+        return np.stack(columns, axis=1)
 
     def from_array(self, features):
-        df = self.get_df()[self.get_feature_names()].copy()
-        feature_types = self.get_dtypes()
-        for c in df.columns:
-            if c in features.keys():
-                if df[c].dtype == "object":
-                    df.loc[:, c] = df.loc[:, c].astype("category")
-                    mapp = {
-                        x: y for x, y in dict(enumerate(df[c].cat.categories)).items()
-                    }
-                    features[c] = np.vectorize(mapp.get)(features[c])
-                    if feature_types[c] == "hash":
-                        features[c] = features[c].astype(str)
-                else:
-                    features[c] = features[c].astype(df[c].dtype)
+        encoders = self.get_encoders()
+        for c in features:
+            if c not in encoders:
+                continue
+            categories, _, dtype, is_hash = encoders[c]
+            if categories is None:
+                features[c] = np.asarray(features[c]).astype(dtype)
+            else:
+                features[c] = categories[np.asarray(features[c]).astype(int)]
+                if is_hash:
+                    features[c] = features[c].astype(str)
         return features
 
     def create_feat_array(self, features):
@@ -573,6 +641,16 @@ class Tabular:
         return categorical_features, categorical_index, categorical_names
 
     def train_input_fn(self, batch_size, num_epochs):
+        records = self.get_record_files("train")
+        if records:
+            return make_tfrecord_dataset(
+                records,
+                batch_size,
+                self.get_keyed_defaults(),
+                self.get_targets(),
+                num_epochs=num_epochs,
+                shuffle=True,
+            )
         csv_dataset = make_csv_dataset(
             [self.get_train_file()],
             batch_size=batch_size,
@@ -584,6 +662,16 @@ class Tabular:
         return csv_dataset
 
     def validation_input_fn(self, batch_size):
+        records = self.get_record_files("valid")
+        if records:
+            return make_tfrecord_dataset(
+                records,
+                batch_size,
+                self.get_keyed_defaults(),
+                self.get_targets(),
+                shuffle=False,
+                cache=False,
+            )
         csv_dataset = make_csv_dataset(
             [self.get_validation_file()],
             batch_size=batch_size,
@@ -597,6 +685,16 @@ class Tabular:
     def test_input_fn(self, batch_size, file=None):
         # file = file or self.get_test_file()[0] if isinstance(self.get_test_file(),
         #                                                      list) else self.get_test_file()  # TODO
+        records = self.get_record_files("test")
+        if records and file == self.get_test_file():
+            return make_tfrecord_dataset(
+                records,
+                batch_size,
+                self.get_keyed_defaults(),
+                self.get_targets(),
+                shuffle=False,
+                cache=False,
+            )
         csv_dataset = make_csv_dataset(
             [file],
             batch_size=batch_size,
@@ -607,7 +705,7 @@ class Tabular:
         )
         return csv_dataset
 
-    def input_predict_fn(self, features):
+    def predict_features(self, features):
         df = self.get_df()
         for t in self.get_targets():
             del features[t]
@@ -620,10 +718,23 @@ class Tabular:
                 if df[k].dtype == "object"
                 else np.array([float(v)]).astype(df[k].dtype)
             )
+        return features
+
+    def input_predict_fn(self, features):
         return tf.estimator.inputs.numpy_input_fn(
-            x=features, y=None, num_epochs=1, shuffle=False
+            x=self.predict_features(features), y=None, num_epochs=1, shuffle=False
         )
 
+    def test_features(self, file):
+        return self.batch_features(pd.read_csv(file))
+
+    def batch_features(self, batch):
+        """Predictor inputs for a DataFrame or Arrow table of rows."""
+        if hasattr(batch, "to_pandas"):
+            batch = batch.to_pandas()
+        df = self.clean_values(batch[self.get_feature_names()].copy())
+        return {k: df[k].values for k in self.get_feature_names()}
+
     def serving_input_receiver_fn(self):
         feature_spec = tf.feature_column.make_parse_example_spec(
             self.get_feature_columns()
@@ -1,10 +1,18 @@
+import glob
+import hashlib
 import os
+import shutil
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
+from PIL import Image as IMAGE
 from tensorflow.python import ops
 from tensorflow.python.ops.image_ops_impl import _AssertAtLeast3DImage
 from oldutils.preprocessing import has_header
+from data.image_stats import DATASET_MEAN_STD, build_manifest, folder_mean_std
 import tensorflow as tf
 
 
@@ -103,6 +111,11 @@ def per_image_standardization(x):
     return (x - mean) / adjusted_stddev
 
 
+def standardize_channels(x, mean, std):
+    """Dataset level normalisation, ``mean``/``std`` are per channel."""
+    return (x - mean) / std
+
+
 MEANS = np.array([123.68, 116.779, 103.939]).astype(np.float32)  # BGR
 norm_options = {
     "unit_length": lambda x: x / 255,
@@ -138,29 +151,130 @@ def dataset_from_files(filenames, labels=None):
     return dataset
 
 
-def dataset_from_array(array, labels=None):
-    if labels is not None:
-        return tf.data.Dataset.from_tensor_slices((array, labels))
-    return tf.data.Dataset.from_tensor_slices(array)
+IMAGE_CACHE_DIR = ".image_cache"
+
+CACHE_WORKERS = 8
+
+MEMMAP_READ_ROWS = 64
+
+
+def _load_resized(filename, height, width, n_channels):
+    im = IMAGE.open(filename)
+    im = im.convert({1: "L", 3: "RGB", 4: "RGBA"}[n_channels])
+    im = im.resize((width, height), resample=IMAGE.BILINEAR)
+    return np.asarray(im, dtype=np.uint8).reshape(height, width, n_channels)
+
+
+def cache_slot(name, source_path):
+    """Prefix of the cache files of split ``name`` of the dataset at ``source_path``.
+
+    A cache file written for a slot supersedes the older ones of the same
+    slot, which are then deleted.
+    """
+    digest = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:8]
+    return f"{name}_{digest}"
+
+
+def _remove_superseded(path, pattern):
+    """Deletes the files matching ``pattern`` other than ``path``.
+
+    Processes that still map a deleted file keep reading it until they
+    unmap it.
+    """
+    for old in glob.glob(pattern):
+        if old != path:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+
+
+def resized_cache_file(filenames, size, cache_dir, slot):
+    """Path of the resized image cache of ``filenames``.
+
+    ``size`` is [height, width, channels] and ``slot`` comes from
+    ``cache_slot``. The cache is keyed by the file list, their modification
+    times and the size.
+    """
+    key = hashlib.sha1(repr(list(size)).encode())
+    for f in filenames:
+        key.update(f"{f}:{os.path.getmtime(f)}".encode())
+    return os.path.join(cache_dir, f"resized_{slot}_{key.hexdigest()}.npy")
+
+
+def cache_resized_images(filenames, size, cache_file, workers=CACHE_WORKERS):
+    """Decodes and resizes ``filenames`` once into a uint8 ``.npy`` cache.
+
+    The cache is returned memory mapped so epochs read the decoded pixels
+    instead of the jpegs, see ``resized_cache_file`` for ``cache_file``.
+    Caches of the same slot written before are deleted.
+    """
+    height, width, n_channels = size
+    if os.path.isfile(cache_file):
+        return np.load(cache_file, mmap_mode="r")
+
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.{uuid.uuid4().hex}.tmp"
+    images = np.lib.format.open_memmap(
+        tmp_file,
+        mode="w+",
+        dtype=np.uint8,
+        shape=(len(filenames), height, width, n_channels),
+    )
+
+    def write(i):
+        images[i] = _load_resized(filenames[i], height, width, n_channels)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(write, range(len(filenames))))
+    images.flush()
+    del images
+    os.replace(tmp_file, cache_file)
+    slot = os.path.basename(cache_file).rsplit("_", 1)[0]
+    _remove_superseded(
+        cache_file, os.path.join(glob.escape(os.path.dirname(cache_file)), f"{slot}_*.npy")
+    )
+    return np.load(cache_file, mmap_mode="r")
+
+
+def dataset_from_memmap(array, labels=None, shuffle=False, num_epochs=1,
+                        read_rows=MEMMAP_READ_ROWS):
+    """Dataset reading the rows of a (memory mapped) array on demand.
+
+    Only row indices go through shuffle and repeat; the rows are then read
+    ``read_rows`` at a time with one numpy call per batch of indices, so
+    the Python call overhead is paid per batch and the array is never
+    embedded in the graph.
+    """
+    dataset = tf.data.Dataset.range(len(array))
+    if shuffle:
+        dataset = dataset.shuffle(len(array))
+    dataset = dataset.repeat(num_epochs).batch(read_rows)
+
+    def read(indices):
+        images = tf.numpy_function(
+            lambda idx: np.asarray(array[idx]), [indices], tf.as_dtype(array.dtype)
+        )
+        images.set_shape((None,) + array.shape[1:])
+        return images
+
+    if labels is None:
+        dataset = dataset.map(read, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    else:
+        labels = tf.constant(labels)
+        dataset = dataset.map(
+            lambda idx: (read(idx), tf.gather(labels, idx)),
+            num_parallel_calls=tf.data.experimental.AUTOTUNE,
+        )
+    return dataset.apply(tf.data.experimental.unbatch())
 
 
 def find_image_files_folder_per_class(data_dir, require_all=True):
-    folders = [
-        d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d))
-    ]
-
-    labels = []
-    filenames = []
-    class_names = []
-    for f in folders:
-        matching_files = []
-        for ext in ["jpg", "jpeg", "png", "PNG", "JPG", "JPEG"]:
-            matching_files += tf.gfile.Glob("%s/%s/*.%s" % (data_dir, f, ext))
-        n_images = len(matching_files)
-        if n_images > 0:
-            labels.extend([f] * n_images)
-            class_names.append(f)
-            filenames.extend(matching_files)
+    files = build_manifest(data_dir)["files"]
+
+    filenames = sorted(files)
+    labels = [files[f]["class"] for f in filenames]
+    class_names = sorted(set(labels))
 
     if require_all:
         assert len(filenames) > 1 and len(set(labels)) > 1
@@ -203,7 +317,91 @@ def find_images_test_file(path):
     return True
 
 
+NPZ_COPY_BUFFER = 16 * 1024 * 1024
+
+SPLIT_CHUNK_ROWS = 1024
+
+
+def npz_to_npy(path_file):
+    """Extracts the arrays of a ``.npz`` file to ``.npy`` files next to it.
+
+    Members are streamed out of the archive, so even compressed files are
+    never held in memory. Returns {array name: npy path}.
+    """
+    stem = os.path.splitext(path_file)[0]
+    paths = {}
+    with zipfile.ZipFile(path_file) as archive:
+        for member in archive.namelist():
+            name = os.path.splitext(member)[0]
+            path = f"{stem}_{name}.npy"
+            if not os.path.isfile(path) or os.path.getmtime(path) < os.path.getmtime(
+                path_file
+            ):
+                with archive.open(member) as src, open(path + ".tmp", "wb") as dst:
+                    shutil.copyfileobj(src, dst, NPZ_COPY_BUFFER)
+                os.replace(path + ".tmp", path)
+            paths[name] = path
+    return paths
+
+
+def load_npz_arrays(path_file):
+    """Arrays of a ``.npz`` file, memory mapped from their extracted copies."""
+    arrays = {}
+    for name, path in npz_to_npy(path_file).items():
+        try:
+            arrays[name] = np.load(path, mmap_mode="r")
+        except ValueError:
+            # object arrays (e.g. string labels) cannot be memory mapped
+            arrays[name] = np.load(path, allow_pickle=True)
+    return arrays
+
+
+def rows_cache_path(cache_dir, name, source_path, indices):
+    """``.npy`` path of the rows ``indices`` of the array stored at ``source_path``.
+
+    The name is keyed by the source file and the indices, so a new split
+    never overwrites files that running workers still map; ``write_rows``
+    deletes the files of the previous split instead.
+    """
+    key = hashlib.sha1(
+        repr((os.path.abspath(source_path), os.path.getmtime(source_path))).encode()
+    )
+    key.update(np.ascontiguousarray(indices, dtype=np.int64).tobytes())
+    slot = cache_slot(name, source_path)
+    return os.path.join(cache_dir, f"{slot}_{key.hexdigest()[:16]}_x.npy")
+
+
+def write_rows(array, indices, path, chunk_rows=SPLIT_CHUNK_ROWS):
+    """Writes ``array[indices]`` to a ``.npy`` file chunk by chunk.
+
+    Returns the new array memory mapped, so splitting a memory mapped
+    dataset never loads it whole. An existing ``path`` is reused as is, and
+    the files of the same slot written before (see ``rows_cache_path``) are
+    deleted.
+    """
+    if os.path.isfile(path):
+        return np.load(path, mmap_mode="r")
+    tmp_file = f"{path}.{uuid.uuid4().hex}.tmp"
+    out = np.lib.format.open_memmap(
+        tmp_file,
+        mode="w+",
+        dtype=array.dtype,
+        shape=(len(indices),) + array.shape[1:],
+    )
+    for start in range(0, len(indices), chunk_rows):
+        chunk = indices[start: start + chunk_rows]
+        out[start: start + len(chunk)] = array[chunk]
+    out.flush()
+    del out
+    os.replace(tmp_file, path)
+    slot = os.path.basename(path).rsplit("_", 2)[0]
+    _remove_superseded(
+        path, os.path.join(glob.escape(os.path.dirname(path)), f"{slot}_*_x.npy")
+    )
+    return np.load(path, mmap_mode="r")
+
+
 def read_numpy_array(path_file):
-    data = np.load(path_file)
-    x, y = data["x"], data["y"]
+    arrays = load_npz_arrays(path_file)
+    x, y = arrays["x"], arrays["y"]
     return x, [str(i) for i in y], [str(i) for i in np.unique(y)]
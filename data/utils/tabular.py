@@ -15,6 +15,13 @@ from tensorflow.python.data.experimental import (
 )
 import tensorflow as tf
 import collections
+import json
+import math
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
 from tensorflow.python.lib.io import file_io
 
 _ACCEPTABLE_CSV_TYPES = (
@@ -162,3 +169,302 @@ def make_csv_dataset(
     dataset = dataset.prefetch(prefetch_buffer_size)
 
     return dataset_ops.DatasetV1Adapter(dataset)
+
+
+RECORDS_PER_SHARD = 50000
+
+RECORD_SPEC_FILE = "spec.json"
+
+
+def record_spec(keyed_defaults):
+    """Python type of every column, as the shards store and parse them."""
+    return {c: type(v).__name__ for c, v in keyed_defaults.items()}
+
+
+def write_record_spec(path, keyed_defaults):
+    with open(os.path.join(path, RECORD_SPEC_FILE), "w") as f:
+        json.dump(record_spec(keyed_defaults), f)
+
+
+def read_record_spec(path):
+    try:
+        with open(os.path.join(path, RECORD_SPEC_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _record_feature(value):
+    if isinstance(value, float):
+        return tf.train.Feature(float_list=tf.train.FloatList(value=[value]))
+    if isinstance(value, int):
+        return tf.train.Feature(int64_list=tf.train.Int64List(value=[value]))
+    return tf.train.Feature(
+        bytes_list=tf.train.BytesList(value=[str(value).encode("utf-8")])
+    )
+
+
+class TFRecordShardWriter:
+    """Appends cleaned dataframe chunks as tf.train.Example TFRecord shards.
+
+    Values are stored with the python type of each column (float, int or
+    str), which must match the converted defaults used to parse them back.
+    """
+
+    def __init__(self, path, name, records_per_shard=RECORDS_PER_SHARD):
+        os.makedirs(path, exist_ok=True)
+        for f in os.listdir(path):
+            if f.startswith(name + "-"):
+                os.remove(os.path.join(path, f))
+        self._path = path
+        self._name = name
+        self._records_per_shard = records_per_shard
+        self._writer = None
+        self._shard_records = 0
+        self.files = []
+
+    def _next_shard(self):
+        if self._writer is not None:
+            self._writer.close()
+        file = os.path.join(self._path, f"{self._name}-{len(self.files):05d}.tfrecord")
+        self._writer = tf.io.TFRecordWriter(file)
+        self._shard_records = 0
+        self.files.append(file)
+
+    def write(self, df):
+        columns = df.columns.tolist()
+        for row in df.itertuples(index=False, name=None):
+            if self._writer is None or self._shard_records == self._records_per_shard:
+                self._next_shard()
+            example = tf.train.Example(
+                features=tf.train.Features(
+                    feature={
+                        c: _record_feature(v.item() if hasattr(v, "item") else v)
+                        for c, v in zip(columns, row)
+                    }
+                )
+            )
+            self._writer.write(example.SerializeToString())
+            self._shard_records += 1
+
+    def close(self):
+        if self._writer is None:
+            self._next_shard()
+        self._writer.close()
+        return self.files
+
+
+def write_tfrecord_shards(df, path, name, records_per_shard=RECORDS_PER_SHARD):
+    """Writes a cleaned dataframe as TFRecord shards, returns the shard files."""
+    writer = TFRecordShardWriter(path, name, records_per_shard)
+    writer.write(df)
+    return writer.close()
+
+
+def make_tfrecord_dataset(
+        files,
+        batch_size,
+        keyed_defaults,
+        label_names,
+        num_epochs=1,
+        shuffle=True,
+        shuffle_buffer_size=10000,
+        cache=True,
+):
+    """Same (features, labels) batches as ``make_csv_dataset`` read from TFRecords.
+
+    Shards are read with a parallel interleave and decoded with an autotuned
+    parallel map; decoded examples are cached so later epochs skip both.
+    """
+    spec = {}
+    for key, default in keyed_defaults.items():
+        if isinstance(default, float):
+            spec[key] = tf.io.FixedLenFeature([], tf.float32)
+        elif isinstance(default, int):
+            spec[key] = tf.io.FixedLenFeature([], tf.int64)
+        else:
+            spec[key] = tf.io.FixedLenFeature([], tf.string)
+
+    def parse_fn(record):
+        parsed = tf.io.parse_single_example(record, spec)
+        features = collections.OrderedDict()
+        for key in keyed_defaults:
+            value = parsed[key]
+            # the csv pipeline yields int32 for integer columns
+            features[key] = tf.cast(value, tf.int32) if value.dtype == tf.int64 else value
+        labels = tf.stack([features.pop(l) for l in label_names])
+        return features, labels
+
+    dataset = tf.data.Dataset.from_tensor_slices(files)
+    dataset = dataset.interleave(
+        tf.data.TFRecordDataset,
+        cycle_length=min(len(files), 4),
+        num_parallel_calls=AUTOTUNE,
+    )
+    dataset = dataset.map(parse_fn, num_parallel_calls=AUTOTUNE)
+    if cache:
+        dataset = dataset.cache()
+    if shuffle:
+        dataset = dataset.shuffle(shuffle_buffer_size)
+    dataset = dataset.repeat(num_epochs)
+    dataset = dataset.batch(batch_size, drop_remainder=num_epochs is None)
+    return dataset.prefetch(AUTOTUNE)
+
+
+SPLIT_CHUNK_SIZE = 100000
+
+STATS_SUFFIX = ".stats.json"
+
+
+def update_column_stats(stats, df):
+    """Merges the numeric columns of a chunk into running count/mean/M2/min/max."""
+    for c in df.columns:
+        if df[c].dtype.kind not in "iuf":
+            continue
+        values = df[c].values.astype(np.float64)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            continue
+        count, mean = len(values), values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        if c not in stats:
+            stats[c] = [count, mean, m2, values.min(), values.max()]
+            continue
+        n, old_mean, old_m2, low, high = stats[c]
+        total = n + count
+        delta = mean - old_mean
+        stats[c] = [
+            total,
+            old_mean + delta * count / total,
+            old_m2 + m2 + delta ** 2 * n * count / total,
+            min(low, values.min()),
+            max(high, values.max()),
+        ]
+    return stats
+
+
+def finalize_column_stats(stats):
+    return {
+        c: {
+            "count": int(n),
+            "mean": float(mean),
+            # sample standard deviation, same as DataFrame.std()
+            "std": float(np.sqrt(m2 / (n - 1))) if n > 1 else 0.0,
+            "min": float(low),
+            "max": float(high),
+        }
+        for c, (n, mean, m2, low, high) in stats.items()
+    }
+
+
+def write_column_stats(file, stats):
+    with open(file + STATS_SUFFIX, "w") as f:
+        json.dump(stats, f)
+
+
+def load_column_stats(file, chunk_size=SPLIT_CHUNK_SIZE):
+    """Per-column mean/std/min/max of a csv file, persisted next to it.
+
+    The statistics are written when the split is created; files without a
+    current sidecar are scanned once in chunks and the result is saved.
+    """
+    stats_file = file + STATS_SUFFIX
+    if os.path.isfile(stats_file):
+        if os.path.getmtime(stats_file) >= os.path.getmtime(file):
+            with open(stats_file) as f:
+                return json.load(f)
+    stats = {}
+    for chunk in pd.read_csv(file, chunksize=chunk_size):
+        update_column_stats(stats, chunk)
+    stats = finalize_column_stats(stats)
+    write_column_stats(file, stats)
+    return stats
+
+# fractional part of the golden ratio, consecutive multiples are equidistributed
+_GOLDEN_RATIO = (math.sqrt(5) - 1) / 2
+
+
+def _class_offset(key, seed):
+    return zlib.crc32(f"{seed}:{key}".encode("utf-8")) / 2 ** 32
+
+
+def stream_split(
+        file,
+        fractions,
+        outputs,
+        target=None,
+        dtype=None,
+        convert_fn=None,
+        clean_fn=None,
+        records_path=None,
+        chunk_size=SPLIT_CHUNK_SIZE,
+        seed=42,
+):
+    """Splits a csv file into train/valid/test files in a single chunked pass.
+
+    The n-th row of each class (of ``target``, or of the whole file when no
+    target is given) is assigned by the low discrepancy sequence
+    ``offset(class) + n * golden_ratio (mod 1)`` so every class is split in
+    the requested proportions without knowing the class sizes up front.
+    Chunks are read with ``dtype`` and passed through ``convert_fn``, so they
+    match the in-memory frame the vocabularies were built from. Splits are
+    appended to the csv ``outputs`` and, when ``records_path`` is set, to
+    TFRecord shards of the rows cleaned by ``clean_fn``.
+
+    Per-column statistics of every split are saved next to its csv.
+
+    Returns the number of rows per split and the shard files per split.
+    """
+    names = list(fractions)
+    total = sum(fractions.values())
+    bounds = np.cumsum([fractions[name] / total for name in names])
+    record_writers = (
+        {name: TFRecordShardWriter(records_path, name) for name in names}
+        if records_path
+        else {}
+    )
+    sizes = dict.fromkeys(names, 0)
+    stats = {name: {} for name in names}
+    class_counts = {}
+    offsets = {}
+    columns = None
+
+    for chunk in pd.read_csv(file, chunksize=chunk_size, dtype=dtype):
+        if convert_fn:
+            chunk = convert_fn(chunk)
+        columns = chunk.columns
+        keys = chunk[target].astype(str) if target else pd.Series("", index=chunk.index)
+        for key in keys.unique():
+            if key not in offsets:
+                offsets[key] = _class_offset(key, seed)
+
+        rank = (
+            keys.groupby(keys).cumcount().values
+            + keys.map(class_counts).fillna(0).values
+        )
+        position = (keys.map(offsets).values + rank * _GOLDEN_RATIO) % 1
+        split_index = np.minimum(
+            np.searchsorted(bounds, position, side="right"), len(names) - 1
+        )
+        for key, count in keys.value_counts().items():
+            class_counts[key] = class_counts.get(key, 0) + count
+
+        for i, name in enumerate(names):
+            part = chunk[split_index == i]
+            part.to_csv(
+                outputs[name],
+                mode="a" if sizes[name] else "w",
+                header=not sizes[name],
+                index=False,
+            )
+            update_column_stats(stats[name], part)
+            if name in record_writers and len(part):
+                part = clean_fn(part.copy()) if clean_fn else part
+                record_writers[name].write(part)
+            sizes[name] += len(part)
+
+    for name in names:
+        if not sizes[name]:
+            pd.DataFrame(columns=columns).to_csv(outputs[name], index=False)
+        write_column_stats(outputs[name], finalize_column_stats(stats[name]))
+    return sizes, {name: w.close() for name, w in record_writers.items()}
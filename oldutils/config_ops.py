@@ -2,12 +2,12 @@ import configparser
 import json
 import shutil
 
-import dill as pickle
 import numpy as np
 import os
 import pandas as pd
 
 from data.image import Image
+from data.store import load_dataset, read_dataset_name
 from data.utils.image import (
     find_image_files_folder_per_class,
     find_image_files_from_file,
@@ -142,10 +142,9 @@ def get_configs_files(USER_ROOT, username, not_validated=False):
             parameters_configs[model]["perf"] = config.get("BEST_MODEL", "max_perf")
             parameters_configs[model]["loss"] = config.get("BEST_MODEL", "min_loss")
         if "PATHS" in config.sections():
-            dataset = pickle.load(open(config.get("PATHS", "data_path"), "rb"))
-            parameters_configs[model][
-                "dataset"
-            ] = dataset.get_name()  # TODO from data object
+            parameters_configs[model]["dataset"] = read_dataset_name(
+                config.get("PATHS", "data_path")
+            )
 
     return models, parameters_configs
 
@@ -157,8 +156,8 @@ def get_grey_scale(USER_ROOT, username, models):
         config = configparser.ConfigParser()
         config.read(os.path.join(path_models, model, "config.ini"))
         if "PATHS" in config.sections():
-            dataset = pickle.load(open(config.get("PATHS", "data_path"), "rb"))
-            if isinstance(dataset, Image) and dataset.get_sample().shape[-1] == 1:
+            dataset = load_dataset(config.get("PATHS", "data_path"))
+            if isinstance(dataset, Image) and dataset.get_sample_shape()[-1] == 1:
                 grey_scale.append(dataset.get_name())
     return grey_scale
 
@@ -1,6 +1,4 @@
 import numpy as np
-import pandas as pd
-from scipy import stats
 
 
 def create_graphs(k, dict_list):
@@ -73,61 +71,3 @@ def check_input(num_feat, top_labels, max_feat, max_labels):
         return "Wrong number of labels. Please try again."
 
     return None
-
-
-def generate_ice_df(request, df, file, targets, dtypes):
-    feature_selected = request.get_json()["explain_feature"]
-    feature_values = request.get_json()["features_values"].copy()
-    for t in targets:
-        feature_values[t] = None
-
-    # TODO type categorical/ float / ...
-    if feature_selected in dtypes["numerical"]:
-        mu, sig = stats.norm.fit(df[feature_selected].values)
-        min = -2 * sig
-        max = 2 * sig
-        posible_values = np.linspace(min, max, num=40).tolist()
-        # posible_values = df[feature_selected].unique()
-        # posible_values = [float(x) for x in posible_values]
-        # posible_values.sort()
-
-    else:
-        posible_values = df[feature_selected].unique()
-        posible_values.sort()
-        posible_values = [str(x) for x in posible_values]
-
-    row_n = len(posible_values)
-
-    features = pd.DataFrame(pd.Series(feature_values)).transpose()
-    new_df = pd.concat([features] * row_n, ignore_index=True)
-    new_df[feature_selected] = posible_values
-
-    for c in dtypes["none"]:
-        new_df[c] = None
-
-    columns = list(df.columns)
-    new_df = new_df[columns]  # Reorder
-
-    file_path = file.split(".csv")[0] + "_ice_explain.csv"
-    new_df.to_csv(file_path, index=False)
-
-    return file_path, posible_values
-
-
-def get_exp_target_prediction(targets, exp_target, final_pred, dtypes):
-    index = (
-        targets.index(exp_target) if len(targets) > 1 else None
-    )  # Target index in targets
-    # TODO
-    if index is not None:
-        if exp_target in dtypes["numerical"]:
-            return [float(x[index]) for x in final_pred["preds"]], None
-        return final_pred["preds"][index], [
-            [float(score) for score in scores[index]] for scores in final_pred["scores"]
-        ]
-
-    if exp_target in dtypes["numerical"]:
-        return [float(x) for x in final_pred["preds"]], None
-    return final_pred["preds"], [
-        [float(score) for score in scores] for scores in final_pred["scores"]
-    ]
@@ -2,6 +2,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from tensorflow.core.protobuf import config_pb2
+from tensorflow.python.platform import tf_logging
 from tensorflow.python.training import session_run_hook
 from tensorflow.python.training.basic_session_run_hooks import (
     NeverTriggerTimer,
@@ -10,6 +12,9 @@ from tensorflow.python.training.basic_session_run_hooks import (
 from tensorflow.python.util.tf_export import tf_export
 
 import smtplib
+import time
+
+INPUT_TRACE_STEPS = 50
 
 
 @tf_export("train_orgin.EmailAtStepHook")
@@ -71,3 +76,64 @@ class EmailAtStepHook(session_run_hook.SessionRunHook):
             message,
         )
         server.quit()
+
+
+def _input_wait_secs(run_metadata):
+    micros = 0
+    for dev_stats in run_metadata.step_stats.dev_stats:
+        for node_stats in dev_stats.node_stats:
+            if "IteratorGetNext" in node_stats.node_name:
+                micros += node_stats.all_end_rel_micros
+    return micros / 1e6
+
+
+class InputTimingHook(session_run_hook.SessionRunHook):
+    """Logs per epoch whether training is input bound or compute bound.
+
+    One step every ``every_n_steps`` is traced and the time spent waiting
+    on the input iterator is compared with the whole step.
+    """
+
+    def __init__(self, steps_per_epoch, every_n_steps=INPUT_TRACE_STEPS):
+        self._steps_per_epoch = max(1, steps_per_epoch)
+        self._every_n_steps = every_n_steps
+        self._step = 0
+        self._reset()
+
+    def _reset(self):
+        self._epoch_start = time.time()
+        self._input_secs = 0.0
+        self._traced_secs = 0.0
+
+    def before_run(self, run_context):
+        self._trace = self._step % self._every_n_steps == 0
+        self._start = time.time()
+        if self._trace:
+            options = config_pb2.RunOptions(trace_level=config_pb2.RunOptions.FULL_TRACE)
+            return session_run_hook.SessionRunArgs(None, options=options)
+        return None
+
+    def after_run(self, run_context, run_values):
+        if self._trace and run_values.run_metadata is not None:
+            step_secs = time.time() - self._start
+            self._traced_secs += step_secs
+            self._input_secs += min(step_secs, _input_wait_secs(run_values.run_metadata))
+        self._step += 1
+        if self._step % self._steps_per_epoch == 0:
+            self._log_epoch()
+
+    def end(self, session):
+        if self._step % self._steps_per_epoch:
+            self._log_epoch()
+
+    def _log_epoch(self):
+        if self._traced_secs:
+            fraction = self._input_secs / self._traced_secs
+            tf_logging.info(
+                "Epoch %d: %.1fs, %.0f%% of step time waiting for input (%s bound)",
+                (self._step - 1) // self._steps_per_epoch + 1,
+                time.time() - self._epoch_start,
+                100 * fraction,
+                "input" if fraction > 0.5 else "compute",
+            )
+        self._reset()
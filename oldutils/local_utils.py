@@ -9,6 +9,8 @@ import os
 import json
 import math
 
+import pandas as pd
+
 
 def load_local_sess(local_sess, request, username, id, USER_ROOT):
     model_name = get_modelname(request)
@@ -47,9 +49,13 @@ def process_test_request(
             return {"error": error}
         set_checkpoint_dir(all_params_config, get_checkpoint(request))
         set_canned_data(username, model_name, USER_ROOT, all_params_config)
-        final_pred, success = th.predict_test_estimator(
-            all_params_config, test_filename
-        )
+        if isinstance(df_test, pd.DataFrame):
+            # tabular rows are already loaded, predict them in memory
+            final_pred, success = th.predict_frame_estimator(all_params_config, df_test)
+        else:
+            final_pred, success = th.predict_test_estimator(
+                all_params_config, test_filename
+            )
         if not success:
             return {"error": final_pred}
         file_path, success = get_file_path(hlp, df_test, final_pred, test_filename)
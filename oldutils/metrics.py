@@ -12,6 +12,8 @@ from scipy import interp
 from sklearn.preprocessing import label_binarize
 from tensorboard.backend.event_processing.event_accumulator import EventAccumulator
 
+from ..core.metrics_store import has_metrics, read_metrics
+
 
 def store_predictions(has_targets, sess, final_pred, output):
     if has_targets:
@@ -240,6 +242,12 @@ def get_metrics(mode, y_true, y_pred, labels, target_len=1, logits=None):
 
 
 def train_eval_graphs(path):
+    if has_metrics(path):
+        graphs = read_metrics(path)
+        graphs.pop("cursor")
+        return graphs
+
+    # models trained before the metrics store only have event files
     train = {}
     eval = {}
 
@@ -191,8 +191,6 @@ def run_post(sess, request, USER_ROOT, username, th):
     sess.get_writer().populate_config(request.form)
     sess.get_writer().write_config(sess.get_config_file())
 
-    th.run_tensor_board(username, sess.get_config_file())
-
     all_params_config = config_reader.read_config(sess.get_config_file())
     get_canned_data(USER_ROOT, username, model_name, all_params_config)
     all_params_config.set_email(db_ops.get_email(username))
@@ -9,7 +9,6 @@ from contextlib import closing
 from pathlib import Path
 
 import numpy as np
-from tensorflow.python.platform import gfile
 from werkzeug.utils import secure_filename
 
 from . import preprocessing
@@ -121,6 +120,8 @@ def mkdir_recursive(path):
 
 
 def delete_recursive(paths, export_dir):
+    from tensorflow.python.platform import gfile
+
     if os.path.isdir(export_dir):
         for p in paths:
             if os.path.exists(os.path.join(export_dir, p)):
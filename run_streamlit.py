@@ -1,37 +1,81 @@
-import os
-
-# 必须并行执行
-# terminal_train = "streamlit run train_app.py --server.port 8501 --server.fileWatcherType none"
-# terminal_upload = "streamlit run upload_image_app.py --server.port 8502 --server.fileWatcherType none"
-# terminal_predict = "streamlit run predict_app.py --server.port 8503 --server.fileWatcherType none"
-
-# TERMINALS = [terminal_train, terminal_upload, terminal_predict]
-# shell = ""
-# for T in TERMINALS:
-#     shell += T + '&'
-
-# os.system(shell)
-
-# os.system("streamlit run upload_image_app.py --server.port 8502 --server.fileWatcherType none")
-
-# For testing detection
-# os.system("streamlit run detect_predict_app.py --server.port 8504 --server.fileWatcherType none")
-
-
-os.system(
-    "streamlit run apps/upload_image_app.py --server.port 8500 --server.fileWatcherType none &" +
-    # 缺陷分类
-    "streamlit run apps/cls_train_app.py --server.port 8501 --server.fileWatcherType none &" +
-    "streamlit run apps/cls_predict_app.py --server.port 8502 --server.fileWatcherType none &" +
-    # 缺陷分割
-    "streamlit run apps/seg_predict_app.py --server.port 8602 --server.fileWatcherType none &" +
-    # 缺陷检测
-    "streamlit run apps/det_predict_app.py --server.port 8702 --server.fileWatcherType none &" +
-    # 故障诊断
-    "streamlit run apps/fd_predict_app.py --server.port 8801 --server.fileWatcherType none &" +
-    "streamlit run apps/fd_preprocessing_app.py --server.port 8802 --server.fileWatcherType none &" +
-    "streamlit run apps/fd_train_app.py --server.port 8803 --server.fileWatcherType none &" +
-    # 图像采集
-    "streamlit run apps/image_capture_app.py --server.port 8901 --server.fileWatcherType none &"
-    )
+import subprocess
+import sys
+import time
+import urllib.request
 
+# 所有页面由 apps/streamlit_host.py 在同一个进程中提供，通过 ?page=<name> 选择
+HOST_SCRIPT = "apps/streamlit_host.py"
+
+PORT = 8500
+
+# streamlit 1.19 的健康检查地址
+HEALTH_URL = f"http://localhost:{PORT}/healthz"
+
+# 启动后等待多久才开始健康检查（秒），导入 torch/mmdet 需要时间
+STARTUP_GRACE = 60
+
+CHECK_INTERVAL = 10
+
+# 连续失败多少次后重启
+MAX_FAILURES = 3
+
+# 重启间隔上限（秒），连续崩溃时按指数退避
+MAX_BACKOFF = 300
+
+
+def start():
+    return subprocess.Popen([
+        sys.executable, "-m", "streamlit", "run", HOST_SCRIPT,
+        "--server.port", str(PORT),
+        "--server.fileWatcherType", "none",
+        "--server.headless", "true",
+    ])
+
+
+def healthy():
+    try:
+        with urllib.request.urlopen(HEALTH_URL, timeout=5) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def supervise():
+    """启动 streamlit，进程退出或健康检查连续失败时重启"""
+    backoff = 1
+    while True:
+        process = start()
+        started = time.time()
+        failures = 0
+        while process.poll() is None:
+            time.sleep(CHECK_INTERVAL)
+            if time.time() - started < STARTUP_GRACE:
+                continue
+            if healthy():
+                failures = 0
+                backoff = 1
+                continue
+            failures += 1
+            print(f"streamlit health check failed ({failures}/{MAX_FAILURES})")
+            if failures >= MAX_FAILURES:
+                stop(process)
+
+        print(f"streamlit exited with code {process.returncode}, restarting in {backoff}s")
+        time.sleep(backoff)
+        backoff = min(backoff * 2, MAX_BACKOFF)
+
+
+if __name__ == "__main__":
+    try:
+        supervise()
+    except KeyboardInterrupt:
+        pass
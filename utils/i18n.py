@@ -0,0 +1,92 @@
+"""
+界面文本（language/text-<lang>.json）的加载与缓存
+文件只在修改后重新解析，请求处理时直接返回内存中的字典；
+缺失的键回退到默认语言
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+LANGUAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "language")
+
+DEFAULT_LANGUAGE = "zh"
+
+# 两次检查文件修改时间的最小间隔（秒）
+RELOAD_INTERVAL = 2.0
+
+
+def _merge(default, texts):
+    merged = dict(default)
+    for key, value in texts.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = _merge(merged[key], value)
+        merged[key] = value
+    return merged
+
+
+class TextCatalog:
+    def __init__(self, language_dir=LANGUAGE_DIR, default=DEFAULT_LANGUAGE,
+                 reload_interval=RELOAD_INTERVAL):
+        self.language_dir = language_dir
+        self.default = default
+        self.reload_interval = reload_interval
+        self._files = {}
+        self._texts = {}
+        self._version = ""
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        files = {}
+        for name in os.listdir(self.language_dir):
+            if name.startswith("text-") and name.endswith(".json"):
+                path = os.path.join(self.language_dir, name)
+                files[name[len("text-"):-len(".json")]] = (path, os.path.getmtime(path))
+        return files
+
+    def _reload(self, files):
+        raw = {}
+        for lang, (path, _) in files.items():
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+            raw[lang] = json.loads(content) if content.strip() else {}
+        default = raw.get(self.default, {})
+        self._texts = {lang: _merge(default, texts) for lang, texts in raw.items()}
+        self._files = files
+        self._version = hashlib.sha1(
+            repr(sorted((lang, mtime) for lang, (_, mtime) in files.items())).encode()
+        ).hexdigest()[:16]
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked < self.reload_interval:
+                return
+            files = self._scan()
+            if files != self._files:
+                self._reload(files)
+            self._checked = now
+
+    def languages(self):
+        self._refresh()
+        return sorted(self._texts)
+
+    def version(self):
+        """变化即表示某个语言文件被修改过，用于生成 ETag"""
+        self._refresh()
+        return self._version
+
+    def texts(self, lang=None):
+        self._refresh()
+        return self._texts.get(lang) or self._texts.get(self.default, {})
+
+    def section(self, section, lang=None):
+        return self.texts(lang).get(section, {})
+
+
+catalog = TextCatalog()
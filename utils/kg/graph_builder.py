@@ -15,6 +15,7 @@ from py2neo import Graph
 import docx
 
 from utils.llm.llm_client import llm_client
+from utils.kg.schema_cache import refresh_kg_schema, invalidate_kg_schema
 
 # ==================== 数据模型定义 ====================
 
@@ -991,6 +992,13 @@ def import_kg_to_neo4j(kg: KnowledgeGraph, graph_name: str = None, kg_id: str =
         # 转换集合为列表
         stats['entity_types'] = list(stats['entity_types'])
         
+        # 导入完成后立即统计并缓存子图schema，供Cypher生成使用
+        try:
+            if kg_id:
+                refresh_kg_schema(kg_id, graph)
+        except Exception as e:
+            print(f"⚠️ 缓存图谱schema失败: {e}")
+        
         print(f"✅ 知识图谱导入完成!")
         print(f"📊 统计: {stats['node_count']}个节点, {stats['relation_count']}个关系")
         print(f"🏷️ 实体类型: {stats['entity_types']}")
@@ -1138,6 +1146,7 @@ def delete_user_kg_subgraph(kg_id):
         
         graph.run(rel_delete_query, kg_id=kg_id)
         graph.run(node_delete_query, kg_id=kg_id)
+        invalidate_kg_schema(kg_id)
         
         print(f"✅ 子图删除成功: {subgraph_label}")
         return True
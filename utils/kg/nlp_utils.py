@@ -1,4 +1,5 @@
 from openai import OpenAI
+from utils.kg.schema_cache import get_kg_schema, format_schema_for_prompt, validate_cypher_against_schema
 
 # 配置你的 DeepSeek API Key
 client = OpenAI(
@@ -10,26 +11,44 @@ client = OpenAI(
 ENTITY_TYPES = "齿轮、检测工具、传动比、离合器、油位、轴承、发动机"
 RELATION_TYPES = "材质、检测工具、功率参数、寿命、故障类型"
 
-def generate_cypher_with_llm(question, query_type="answer"):
+# 生成的Cypher未通过schema校验时的最大重新生成次数
+MAX_SCHEMA_RETRIES = 1
+
+def build_schema_prompt(kg_id="default"):
+    """
+    根据图谱的实时schema构建提示词片段，schema不可用时退回静态类型列表
+    :param kg_id: 知识图谱ID
+    :return: (提示词片段, schema)
+    """
+    schema = get_kg_schema(kg_id)
+    if schema and schema['labels']:
+        return format_schema_for_prompt(schema), schema
+    return f"实体类型：{ENTITY_TYPES}\n关系类型：{RELATION_TYPES}", None
+
+def generate_cypher_with_llm(question, query_type="answer", kg_id="default", schema_prompt=None, feedback=None):
     """
     调用大模型API，将自然语言问题转为Cypher查询语句
     :param question: 用户输入的问题
     :param query_type: 查询类型，"answer"用于获取答案，"visualization"用于可视化
+    :param kg_id: 知识图谱ID，用于获取该图谱的schema
+    :param schema_prompt: 预先构建的schema提示词，为空时按kg_id构建
+    :param feedback: 上一次生成结果的校验错误，用于引导大模型修正
     :return: Cypher查询语句
     """
+    if schema_prompt is None:
+        schema_prompt, _ = build_schema_prompt(kg_id)
+
     if query_type == "answer":
         prompt = (
-            f"你是一个知识图谱问答助手。请根据下列实体类型和关系类型，将用户问题转换为Cypher查询语句。\n"
-            f"实体类型：{ENTITY_TYPES}\n"
-            f"关系类型：{RELATION_TYPES}\n"
+            f"你是一个知识图谱问答助手。请根据下列图谱结构，将用户问题转换为Cypher查询语句。\n"
+            f"{schema_prompt}\n"
             f"问题：{question}\n"
             f"只输出Cypher语句，不要输出任何其他内容。"
         )
     elif query_type == "visualization":
         prompt = (
-            f"你是一个知识图谱可视化助手。请根据下列实体类型和关系类型，将用户问题转换为用于图形可视化的Cypher查询语句。\n"
-            f"实体类型：{ENTITY_TYPES}\n"
-            f"关系类型：{RELATION_TYPES}\n"
+            f"你是一个知识图谱可视化助手。请根据下列图谱结构，将用户问题转换为用于图形可视化的Cypher查询语句。\n"
+            f"{schema_prompt}\n"
             f"问题：{question}\n"
             f"要求：\n"
             f"1. 查询结果必须包含节点和关系，格式为 MATCH (m)-[r]->(n) RETURN m,r,n\n"
@@ -39,6 +58,9 @@ def generate_cypher_with_llm(question, query_type="answer"):
         )
     else:
         raise ValueError("query_type must be 'answer' or 'visualization'")
+
+    if feedback:
+        prompt += f"\n上一次生成的语句有误（{feedback}），只能使用上面列出的标签和关系类型。"
     
     response = client.chat.completions.create(
         model="deepseek-chat",
@@ -50,33 +72,55 @@ def generate_cypher_with_llm(question, query_type="answer"):
     )
     return response.choices[0].message.content.strip()
 
-def process_question_with_llm(question):
+def generate_validated_cypher(question, query_type="answer", kg_id="default"):
+    """
+    生成Cypher查询语句并用图谱schema预校验，校验失败时带着错误信息重新生成
+    :param question: 用户输入的问题
+    :param query_type: 查询类型，"answer"或"visualization"
+    :param kg_id: 知识图谱ID
+    :return: 校验通过的Cypher查询语句，无法生成有效语句时返回None
+    """
+    schema_prompt, schema = build_schema_prompt(kg_id)
+    feedback = None
+    for attempt in range(MAX_SCHEMA_RETRIES + 1):
+        cypher = generate_cypher_with_llm(question, query_type, kg_id, schema_prompt, feedback)
+        errors = validate_cypher_against_schema(cypher, schema)
+        if not errors:
+            return cypher
+        feedback = "；".join(errors)
+        print(f"⚠️ Cypher未通过schema校验 (尝试 {attempt + 1}/{MAX_SCHEMA_RETRIES + 1}): {feedback}")
+    return None
+
+def process_question_with_llm(question, kg_id="default"):
     """
     用大模型API生成用于获取答案的Cypher查询语句
     :param question: 用户输入的问题
+    :param kg_id: 知识图谱ID
     :return: Cypher查询语句
     """
-    cypher = generate_cypher_with_llm(question, "answer")
+    cypher = generate_validated_cypher(question, "answer", kg_id)
     return cypher
 
-def generate_visualization_cypher(question):
+def generate_visualization_cypher(question, kg_id="default"):
     """
     用大模型API生成用于可视化的Cypher查询语句
     :param question: 用户输入的问题
+    :param kg_id: 知识图谱ID
     :return: 用于可视化的Cypher查询语句
     """
-    cypher = generate_cypher_with_llm(question, "visualization")
+    cypher = generate_validated_cypher(question, "visualization", kg_id)
     return cypher
 
 # 如果 nlp_utils.py 中有Neo4j连接代码，确保使用简单配置：
-def process_question_for_both(question):
+def process_question_for_both(question, kg_id="default"):
     """
     同时生成答案查询和可视化查询
     :param question: 用户输入的问题
+    :param kg_id: 知识图谱ID
     :return: (答案查询, 可视化查询)
     """
     # 生成答案查询
-    answer_cypher = process_question_with_llm(question)
+    answer_cypher = process_question_with_llm(question, kg_id)
     
     # 清理答案查询，确保只有一个查询
     if isinstance(answer_cypher, str) and ';' in answer_cypher:
@@ -86,7 +130,7 @@ def process_question_for_both(question):
             answer_cypher = queries[0]
     
     # 生成可视化查询
-    visualization_cypher = generate_visualization_cypher(question)
+    visualization_cypher = generate_visualization_cypher(question, kg_id)
     
     # 清理可视化查询
     if isinstance(visualization_cypher, str) and ';' in visualization_cypher:
@@ -0,0 +1,280 @@
+"""
+Cypher 查询防护模块
+对大模型生成的 Cypher 做执行前检查：只允许只读语句、自动注入/收紧 LIMIT、
+限定用户子图查询的节点范围，通过 EXPLAIN 拒绝代价过大的笛卡尔积，
+并为每条查询设置服务端超时，
+同时统计拒绝次数和执行耗时
+"""
+
+import re
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# 单条查询最多返回的记录数
+MAX_RESULT_ROWS = 100
+
+# 单条查询的超时时间（秒）
+QUERY_TIMEOUT = 10
+
+# 笛卡尔积算子允许的最大预估行数
+MAX_CARTESIAN_ROWS = 100000
+
+# 写操作及存储过程调用关键字（生成的查询只允许读）
+_WRITE_PATTERN = re.compile(
+    r'(?<![.\w])(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|FOREACH|LOAD\s+CSV|CALL|TERMINATE)(?!\w)',
+    re.IGNORECASE
+)
+_STRING_PATTERN = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_COMMENT_PATTERN = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+# 从左到右同时匹配字符串和注释，字符串里的 // 与注释里的引号互不干扰
+_LITERAL_PATTERN = re.compile(f"{_STRING_PATTERN.pattern}|{_COMMENT_PATTERN.pattern}", re.DOTALL)
+_RETURN_PATTERN = re.compile(r'(?<![.\w])RETURN(?!\w)', re.IGNORECASE)
+_LIMIT_PATTERN = re.compile(r'(?<![.\w])LIMIT\s+(\d+)\s*$', re.IGNORECASE)
+_PARAM_LIMIT_PATTERN = re.compile(r'(?<![.\w])LIMIT\s+\$\w+\s*$', re.IGNORECASE)
+_CODE_FENCE_PATTERN = re.compile(r'^```\w*\s*|\s*```$')
+# 节点模式 (n) / (n:A:B {...}) / (:A)，word 为括号前紧邻的单词，用于排除函数调用 count(n)
+_NODE_PATTERN = re.compile(
+    r'(?:(?P<word>\w+)\s*)?\(\s*(?P<var>`?\w+`?)?\s*(?P<labels>:[^{})]*)?[{)]'
+)
+_LABELS_PATTERN = re.compile(r'(?:\s*[:&]\s*`?\w+`?)+\s*')
+# 后面可以直接跟节点模式的关键字，其余单词后的括号视为函数调用
+_PATTERN_KEYWORDS = {'MATCH', 'WHERE', 'AND', 'OR', 'XOR', 'NOT', 'EXISTS', 'RETURN', 'WITH', 'UNION'}
+
+# 打在查询前的注释标记，超时后据此在服务端定位并终止事务
+_QUERY_TAG = 'kg_guard'
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='kg_query')
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'executed': 0,
+    'failed': 0,
+    'timeouts': 0,
+    'rejected': {},
+    'total_time': 0.0,
+    'max_time': 0.0
+}
+
+
+class CypherGuardError(Exception):
+    """查询被防护规则拒绝或执行超时"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _record_rejection(reason):
+    with _metrics_lock:
+        _metrics['rejected'][reason] = _metrics['rejected'].get(reason, 0) + 1
+
+
+def get_query_metrics():
+    """获取查询防护的统计信息"""
+    with _metrics_lock:
+        executed = _metrics['executed']
+        return {
+            'executed': executed,
+            'failed': _metrics['failed'],
+            'timeouts': _metrics['timeouts'],
+            'rejected': dict(_metrics['rejected']),
+            'avg_time': round(_metrics['total_time'] / executed, 4) if executed else 0.0,
+            'max_time': round(_metrics['max_time'], 4)
+        }
+
+
+def _blank(match):
+    text = match.group(0)
+    if text[0] in '\'"':
+        return text[0] + ' ' * (len(text) - 2) + text[0]
+    return ' ' * len(text)
+
+
+def _strip_literals(cypher):
+    """把字符串字面量的内容和注释替换为等长空白，避免其中的文字被误判为关键字；
+    长度不变，匹配位置可以直接用于原语句"""
+    return _LITERAL_PATTERN.sub(_blank, cypher)
+
+
+def sanitize_cypher(cypher):
+    """清理大模型输出：去掉代码块标记，只保留第一条语句"""
+    cypher = _CODE_FENCE_PATTERN.sub('', cypher.strip()).strip()
+    statements = [q.strip() for q in cypher.split(';') if q.strip()]
+    if len(statements) > 1:
+        print(f"⚠️ 检测到多个查询，只保留第一个: {statements[0]}")
+    return statements[0] if statements else ''
+
+
+def _node_labels(labels):
+    """解析节点模式中的标签，包含 | ! % 等标签表达式时返回 None"""
+    if not labels:
+        return set()
+    if not _LABELS_PATTERN.fullmatch(labels):
+        return None
+    return {label.strip('`') for label in re.split(r'[\s:&]+', labels) if label}
+
+
+def _check_scope(stripped, scope_label):
+    """要求每个节点模式都带有子图标签，或引用已用子图标签绑定的变量
+
+    Raises:
+        CypherGuardError: 存在未限定在子图内的节点模式
+    """
+    patterns = []
+    for match in _NODE_PATTERN.finditer(stripped):
+        word = match.group('word')
+        if word and word.upper() not in _PATTERN_KEYWORDS:
+            continue
+        var = (match.group('var') or '').strip('`')
+        labels = _node_labels(match.group('labels'))
+        patterns.append((var, labels is not None and scope_label in labels))
+
+    scoped_vars = {var for var, scoped in patterns if var and scoped}
+    for var, scoped in patterns:
+        if not scoped and var not in scoped_vars:
+            _record_rejection('scope')
+            raise CypherGuardError(
+                'scope', f"节点 ({var}) 未限定在子图 {scope_label} 内，所有节点都必须带有该标签"
+            )
+
+
+def guard_cypher(cypher, max_rows=MAX_RESULT_ROWS, scope_label=None):
+    """对 Cypher 做静态检查并注入 LIMIT
+
+    Args:
+        cypher (str): 待检查的查询语句
+        max_rows (int): 最多返回的记录数
+        scope_label (str): 用户子图标签，指定时所有节点模式都必须限定在该子图内
+
+    Returns:
+        str: 可执行的查询语句
+
+    Raises:
+        CypherGuardError: 语句为空、包含写操作或超出子图范围
+    """
+    cypher = sanitize_cypher(cypher or '')
+    if not cypher:
+        _record_rejection('empty')
+        raise CypherGuardError('empty', '查询语句为空')
+
+    stripped = _strip_literals(cypher)
+    write_match = _WRITE_PATTERN.search(stripped)
+    if write_match:
+        _record_rejection('write')
+        raise CypherGuardError('write', f"不允许执行写操作或过程调用: {write_match.group(1).upper()}")
+    if scope_label:
+        _check_scope(stripped, scope_label)
+
+    # 只处理最后一个 RETURN 之后的 LIMIT；先去掉末尾注释，避免 LIMIT 100000 // all 绕过检测
+    if _RETURN_PATTERN.search(stripped) and not _PARAM_LIMIT_PATTERN.search(stripped):
+        stripped = stripped.rstrip()
+        cypher = cypher[:len(stripped)]
+        limit_match = _LIMIT_PATTERN.search(stripped)
+        if limit_match is None:
+            cypher = f"{cypher}\nLIMIT {max_rows}"
+        elif int(limit_match.group(1)) > max_rows:
+            cypher = f"{cypher[:limit_match.start()]}LIMIT {max_rows}"
+    return cypher
+
+
+def _iter_plan(plan):
+    """遍历执行计划树，兼容字典和对象两种表示"""
+    if plan is None:
+        return
+    yield plan
+    children = plan.get('children') if isinstance(plan, dict) else getattr(plan, 'children', None)
+    for child in children or []:
+        yield from _iter_plan(child)
+
+
+def _plan_field(plan, dict_key, attr_name):
+    if isinstance(plan, dict):
+        return plan.get(dict_key, plan.get(attr_name))
+    return getattr(plan, attr_name, None)
+
+
+def check_query_plan(graph, cypher, parameters=None, max_cartesian_rows=MAX_CARTESIAN_ROWS):
+    """用 EXPLAIN 获取执行计划，拒绝预估规模过大的笛卡尔积
+
+    Raises:
+        CypherGuardError: 执行计划包含超出阈值的笛卡尔积
+    """
+    plan = graph.run(f"EXPLAIN {cypher}", parameters or {}).plan()
+    for node in _iter_plan(plan):
+        operator = _plan_field(node, 'operatorType', 'operator_type') or ''
+        if not operator.startswith('CartesianProduct'):
+            continue
+        args = _plan_field(node, 'args', 'args') or {}
+        estimated_rows = args.get('EstimatedRows', 0)
+        if estimated_rows > max_cartesian_rows:
+            _record_rejection('cartesian_product')
+            raise CypherGuardError(
+                'cartesian_product',
+                f"查询包含预估 {int(estimated_rows)} 行的笛卡尔积，请增加关联条件"
+            )
+
+
+def _terminate_tagged_query(graph, tag):
+    """在服务端终止带有指定标记的查询事务"""
+    try:
+        rows = graph.run(
+            "SHOW TRANSACTIONS YIELD transactionId, currentQuery "
+            "WHERE currentQuery CONTAINS $tag RETURN transactionId",
+            tag=tag
+        ).data()
+        for row in rows:
+            graph.run(f"TERMINATE TRANSACTION '{row['transactionId']}'")
+            print(f"🛑 已终止超时查询事务: {row['transactionId']}")
+    except Exception as e:
+        print(f"⚠️ 终止超时查询失败: {e}")
+
+
+def run_guarded_query(graph, cypher, parameters=None, timeout=QUERY_TIMEOUT,
+                      max_rows=MAX_RESULT_ROWS, explain=True, scope_label=None):
+    """在防护规则下执行只读 Cypher 查询
+
+    Args:
+        graph: py2neo Graph 实例
+        cypher (str): 待执行的查询语句
+        parameters (dict): 查询参数
+        timeout (float): 超时时间（秒），超时后在服务端终止该事务
+        max_rows (int): 最多返回的记录数
+        explain (bool): 是否先用 EXPLAIN 检查执行计划
+        scope_label (str): 用户子图标签，指定时拒绝访问子图以外节点的查询
+
+    Returns:
+        tuple: (查询结果列表, 实际执行的语句)
+
+    Raises:
+        CypherGuardError: 查询被拒绝或执行超时
+    """
+    cypher = guard_cypher(cypher, max_rows, scope_label)
+    if explain:
+        check_query_plan(graph, cypher, parameters)
+
+    tag = f"{_QUERY_TAG}:{uuid.uuid4().hex}"
+    tagged_cypher = f"/* {tag} */ {cypher}"
+    start_time = time.time()
+    future = _executor.submit(lambda: graph.run(tagged_cypher, parameters or {}).data())
+    try:
+        result = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        _terminate_tagged_query(graph, tag)
+        with _metrics_lock:
+            _metrics['timeouts'] += 1
+        _record_rejection('timeout')
+        raise CypherGuardError('timeout', f"查询超过 {timeout} 秒未完成，已终止")
+    except Exception:
+        with _metrics_lock:
+            _metrics['failed'] += 1
+        raise
+
+    elapsed = time.time() - start_time
+    with _metrics_lock:
+        _metrics['executed'] += 1
+        _metrics['total_time'] += elapsed
+        _metrics['max_time'] = max(_metrics['max_time'], elapsed)
+    print(f"⏱️ 查询耗时 {elapsed:.3f}s，返回 {len(result)} 条结果")
+    return result, cypher
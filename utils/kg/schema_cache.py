@@ -0,0 +1,204 @@
+"""
+知识图谱 Schema 缓存模块
+按 kg_id 缓存图谱的标签、关系类型、属性键及数量，
+用于构建紧凑的 Cypher 生成提示词，并在执行前校验生成的 Cypher
+"""
+
+import re
+import time
+import threading
+from py2neo import Graph
+
+# 缓存有效期（秒），超时后下次访问时重新统计
+SCHEMA_CACHE_TTL = 600
+
+# 提示词中每类最多列出的条目数，避免提示词过长
+PROMPT_MAX_ITEMS = 30
+
+_schema_cache = {}
+_schema_lock = threading.Lock()
+
+# (n:Label:Other) / (:Label) 中的标签
+_NODE_LABEL_PATTERN = re.compile(r'\(\s*\w*\s*((?::\s*`?\w+`?\s*)+)[\s{)]')
+# [r:TYPE] / [:TYPE|OTHER*1..2] 中的关系类型
+_REL_TYPE_PATTERN = re.compile(r'\[\s*\w*\s*:\s*([^\]{*\s]+)')
+
+
+def _get_graph():
+    return Graph("bolt://localhost:7687", auth=("neo4j", "3080neo4j"), secure=False)
+
+
+def get_subgraph_label(kg_id):
+    """获取用户子图对应的标签名，默认图谱返回 None"""
+    if not kg_id or kg_id == 'default':
+        return None
+    return f"UserKG_{kg_id.replace('-', '_')}"
+
+
+def _schema_queries(kg_id):
+    """根据 kg_id 生成统计 schema 所需的 Cypher 语句"""
+    subgraph_label = get_subgraph_label(kg_id)
+    if subgraph_label is None:
+        node_match = "MATCH (n) WHERE NOT any(label IN labels(n) WHERE label STARTS WITH 'UserKG_')"
+        rel_match = "MATCH ()-[r]->() WHERE r.kg_id IS NULL"
+    else:
+        node_match = f"MATCH (n:{subgraph_label}) WHERE n.kg_id = $kg_id"
+        rel_match = f"MATCH (:{subgraph_label})-[r]->(:{subgraph_label}) WHERE r.kg_id = $kg_id"
+
+    return {
+        'labels': f"""
+            {node_match}
+            UNWIND labels(n) AS label
+            RETURN label, count(*) AS count
+        """,
+        'relationship_types': f"""
+            {rel_match}
+            RETURN type(r) AS type, count(*) AS count
+        """,
+        'node_property_keys': f"""
+            {node_match}
+            UNWIND keys(n) AS key
+            RETURN DISTINCT key
+        """,
+        'relationship_property_keys': f"""
+            {rel_match}
+            UNWIND keys(r) AS key
+            RETURN DISTINCT key
+        """,
+    }
+
+
+def build_kg_schema(kg_id='default', graph=None):
+    """从 Neo4j 统计指定图谱的 schema
+
+    Returns:
+        dict: labels / relationship_types 为 {名称: 数量}，
+              node_property_keys / relationship_property_keys 为排序后的列表
+    """
+    if graph is None:
+        graph = _get_graph()
+    queries = _schema_queries(kg_id)
+    params = {} if get_subgraph_label(kg_id) is None else {'kg_id': kg_id}
+
+    labels = {}
+    for row in graph.run(queries['labels'], **params).data():
+        # 子图标签和内部标签不暴露给大模型
+        if row['label'].startswith('UserKG_') or row['label'] == '__Entity__':
+            continue
+        labels[row['label']] = row['count']
+
+    relationship_types = {row['type']: row['count']
+                          for row in graph.run(queries['relationship_types'], **params).data()}
+    node_property_keys = sorted(row['key'] for row in graph.run(queries['node_property_keys'], **params).data())
+    relationship_property_keys = sorted(
+        row['key'] for row in graph.run(queries['relationship_property_keys'], **params).data())
+
+    return {
+        'kg_id': kg_id,
+        'subgraph_label': get_subgraph_label(kg_id),
+        'labels': labels,
+        'relationship_types': relationship_types,
+        'node_property_keys': node_property_keys,
+        'relationship_property_keys': relationship_property_keys,
+        'node_count': sum(labels.values()),
+        'relation_count': sum(relationship_types.values()),
+        'built_at': time.time()
+    }
+
+
+def refresh_kg_schema(kg_id='default', graph=None):
+    """重新统计并缓存图谱 schema（图谱导入完成后调用）"""
+    schema = build_kg_schema(kg_id, graph)
+    with _schema_lock:
+        _schema_cache[kg_id] = schema
+    print(f"✅ 图谱schema已缓存: {kg_id} ({len(schema['labels'])} 个标签, "
+          f"{len(schema['relationship_types'])} 种关系)")
+    return schema
+
+
+def get_kg_schema(kg_id='default', graph=None):
+    """获取图谱 schema，缓存缺失或过期时重新统计；统计失败返回 None"""
+    with _schema_lock:
+        schema = _schema_cache.get(kg_id)
+    if schema is not None and time.time() - schema['built_at'] < SCHEMA_CACHE_TTL:
+        return schema
+    try:
+        return refresh_kg_schema(kg_id, graph)
+    except Exception as e:
+        print(f"❌ 获取图谱schema失败: {e}")
+        # 统计失败时退回到过期的缓存
+        return schema
+
+
+def invalidate_kg_schema(kg_id=None):
+    """使指定图谱（或全部图谱）的 schema 缓存失效"""
+    with _schema_lock:
+        if kg_id is None:
+            _schema_cache.clear()
+        else:
+            _schema_cache.pop(kg_id, None)
+
+
+def format_schema_for_prompt(schema, max_items=PROMPT_MAX_ITEMS):
+    """将 schema 转换为紧凑的提示词片段，按数量从多到少列出"""
+
+    def top(counts):
+        items = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:max_items]
+        return "、".join(f"{name}({count})" for name, count in items) or "无"
+
+    lines = [
+        f"节点标签：{top(schema['labels'])}",
+        f"关系类型：{top(schema['relationship_types'])}",
+        f"节点属性：{'、'.join(schema['node_property_keys'][:max_items]) or '无'}",
+    ]
+    if schema['relationship_property_keys']:
+        lines.append(f"关系属性：{'、'.join(schema['relationship_property_keys'][:max_items])}")
+    if schema['subgraph_label']:
+        lines.append(f"所有节点都必须带有标签 {schema['subgraph_label']}，"
+                     f"并满足 kg_id = '{schema['kg_id']}'")
+    return "\n".join(lines)
+
+
+def extract_cypher_schema_refs(cypher):
+    """提取 Cypher 语句中引用的节点标签和关系类型
+
+    Returns:
+        tuple: (标签集合, 关系类型集合)
+    """
+    labels = set()
+    for match in _NODE_LABEL_PATTERN.finditer(cypher):
+        for label in match.group(1).split(':'):
+            label = label.strip().strip('`')
+            if label:
+                labels.add(label)
+
+    rel_types = set()
+    for match in _REL_TYPE_PATTERN.finditer(cypher):
+        for rel_type in match.group(1).split('|'):
+            rel_type = rel_type.strip().lstrip(':').strip('`')
+            if rel_type:
+                rel_types.add(rel_type)
+    return labels, rel_types
+
+
+def validate_cypher_against_schema(cypher, schema):
+    """校验 Cypher 中引用的标签和关系类型是否存在于图谱中
+
+    Returns:
+        list: 错误信息列表，为空表示校验通过
+    """
+    if not cypher or schema is None:
+        return []
+    labels, rel_types = extract_cypher_schema_refs(cypher)
+    known_labels = set(schema['labels'])
+    if schema['subgraph_label']:
+        known_labels.add(schema['subgraph_label'])
+
+    errors = []
+    unknown_labels = sorted(labels - known_labels)
+    if unknown_labels:
+        errors.append(f"不存在的节点标签: {', '.join(unknown_labels)}")
+    unknown_rel_types = sorted(rel_types - set(schema['relationship_types']))
+    if unknown_rel_types:
+        errors.append(f"不存在的关系类型: {', '.join(unknown_rel_types)}")
+    return errors